@@ -0,0 +1,47 @@
+# analytics.py
+# Occupancy time-series pipeline for the dashboard. Imported lazily (numpy/scipy are
+# only loaded when the Dashboard is first shown).
+import time
+import numpy as np
+from scipy import stats
+
+SECONDS_PER_DAY = 86400
+
+def load_occupancy(db_manager, days=None):
+    # One columnar fetch of the daily series: (day start in unix seconds, occupancy %)
+    rows = db_manager.get_occupancy_series(days)
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    data = np.array(rows, dtype=np.float64)
+    day_starts = data[:, 0].astype(np.int64)
+    occupied, totals = data[:, 1], data[:, 2]
+    pct = np.divide(occupied * 100.0, totals, out=np.zeros_like(occupied), where=totals > 0)
+    return day_starts, pct
+
+def resample_daily(day_starts, pct, end_day, days):
+    # Values on a regular daily grid ending at end_day, carrying the last known value
+    # forward over days without a rollup; days before the first sample are dropped
+    grid = end_day - SECONDS_PER_DAY * np.arange(days - 1, -1, -1, dtype=np.int64)
+    positions = np.searchsorted(day_starts, grid, side="right") - 1
+    known = positions >= 0
+    return grid[known], pct[positions[known]]
+
+def downsample(x, y, max_points):
+    # Averages consecutive samples into at most max_points bins
+    if len(x) <= max_points:
+        return x.astype(np.float64), y
+    starts = np.linspace(0, len(x), max_points + 1).astype(np.int64)[:-1]
+    counts = np.diff(np.append(starts, len(x)))
+    return np.add.reduceat(x, starts) / counts, np.add.reduceat(y, starts) / counts
+
+def occupancy_trend(db_manager, days=90, max_points=60):
+    # Returns (days relative to today, occupancy %, fitted trend, r value) ready to plot
+    day_starts, pct = load_occupancy(db_manager, days)
+    today = int(time.time()) // SECONDS_PER_DAY * SECONDS_PER_DAY
+    x, y = resample_daily(day_starts, pct, today, days)
+    x, y = downsample(x, y, max_points)
+    x = (x - today) / SECONDS_PER_DAY
+    if len(x) < 2 or np.all(y == y[0]):
+        return x, y, y.copy(), 0.0
+    slope, intercept, r_value, _, _ = stats.linregress(x, y)
+    return x, y, slope * x + intercept, r_value
@@ -0,0 +1,80 @@
+import hashlib
+import mmap
+import os
+import tempfile
+from contextlib import contextmanager
+
+class AttachmentStore:
+    # Content-addressed blob directory: every file is stored once under its SHA-256,
+    # so the same document sent to many tenants takes the space of one copy
+    CHUNK_SIZE = 1 << 20
+    # Blobs at least this large are read back through mmap instead of read()
+    MMAP_THRESHOLD = 1 << 20
+    
+    def __init__(self, root):
+        self.root = root
+    
+    @classmethod
+    def for_database(cls, db_name):
+        # Blobs live in an "attachments" directory next to the database file
+        return cls(os.path.join(os.path.dirname(os.path.abspath(db_name)), "attachments"))
+    
+    def blob_path(self, sha256):
+        return os.path.join(self.root, sha256[:2], sha256)
+    
+    def has_blob(self, sha256):
+        return os.path.exists(self.blob_path(sha256))
+    
+    def store_file(self, file_path):
+        # Streams the file into the store in fixed-size chunks, hashing while copying.
+        # Returns (sha256, size)
+        os.makedirs(self.root, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        buffer = bytearray(self.CHUNK_SIZE)
+        view = memoryview(buffer)
+        fd, temp_path = tempfile.mkstemp(dir=self.root, suffix=".part")
+        try:
+            with open(file_path, "rb") as source, os.fdopen(fd, "wb") as target:
+                while True:
+                    n = source.readinto(buffer)
+                    if not n:
+                        break
+                    digest.update(view[:n])
+                    target.write(view[:n])
+                    size += n
+            sha256 = digest.hexdigest()
+            final_path = self.blob_path(sha256)
+            if os.path.exists(final_path):
+                # Already stored: keep the existing copy
+                os.remove(temp_path)
+            else:
+                os.makedirs(os.path.dirname(final_path), exist_ok=True)
+                os.replace(temp_path, final_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return sha256, size
+    
+    @contextmanager
+    def open_blob(self, sha256):
+        # Yields a read-only buffer over the blob; large blobs are memory-mapped so only
+        # the pages actually touched are loaded
+        with open(self.blob_path(sha256), "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < self.MMAP_THRESHOLD:
+                yield f.read()
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                yield mapped
+    
+    def export(self, sha256, dest_path):
+        # Copies a blob out of the store in chunks
+        with self.open_blob(sha256) as data, open(dest_path, "wb") as target:
+            view = memoryview(data)
+            try:
+                for offset in range(0, len(data), self.CHUNK_SIZE):
+                    target.write(view[offset:offset + self.CHUNK_SIZE])
+            finally:
+                view.release()
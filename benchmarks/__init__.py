@@ -0,0 +1 @@
+# Headless benchmarks for DatabaseManager; run with `python -m benchmarks`
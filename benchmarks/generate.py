@@ -0,0 +1,84 @@
+# Seeded synthetic data for benchmarks. Everything goes through DatabaseManager's
+# schema (migrations, triggers), so derived tables are populated as in the app
+import datetime
+import random
+from model import DatabaseManager
+
+FIRST_NAMES = ["Ange", "Marie", "Paul", "Awa", "Jean", "Fatou", "Eric", "Grace", "Samuel", "Nadia"]
+LAST_NAMES = ["Mbarga", "Nkomo", "Fotso", "Tchoua", "Ndiaye", "Kamga", "Ebong", "Manga"]
+WORDS = ["rent", "water", "power", "repair", "key", "door", "payment", "meeting", "noise",
+         "tomorrow", "today", "please", "thanks", "room", "leak", "bill", "visit", "parking"]
+
+# Row counts per preset; "groups" are extra groups on top of each landlord's own group
+SIZES = {
+    "small": dict(landlords=2, tenants=200, rooms=250, groups=4, statuses=500, messages=5000),
+    "medium": dict(landlords=10, tenants=2000, rooms=2500, groups=40, statuses=5000, messages=50000),
+    "large": dict(landlords=50, tenants=20000, rooms=25000, groups=400, statuses=50000, messages=500000),
+}
+
+def random_text(rng, low=3, high=12):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(low, high)))
+
+def timestamps(rng, count, days=365):
+    # Sorted timestamps spread over the last `days` days
+    start = datetime.datetime(2025, 1, 1)
+    offsets = sorted(rng.randrange(days * 86400) for _ in range(count))
+    return [(start + datetime.timedelta(seconds=s)).strftime("%Y-%m-%d %H:%M:%S") for s in offsets]
+
+def generate_database(db_name, landlords, tenants, rooms, groups, statuses, messages, seed=0, pooled=True):
+    # Builds a database at db_name and returns (DatabaseManager, info) where info holds
+    # the generated ids benchmarks sample from
+    rng = random.Random(seed)
+    db = DatabaseManager(db_name, pooled=pooled)
+    with db.transaction() as c:
+        c.executemany("INSERT INTO users (phone, name, password, role) VALUES (?, ?, ?, 'landlord')",
+                      ((f"6{i:08d}", f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}", "secret")
+                       for i in range(landlords)))
+        c.execute("SELECT id FROM users WHERE role = 'landlord' ORDER BY id")
+        landlord_ids = [row[0] for row in c.fetchall()]
+        c.executemany("INSERT INTO users (phone, name, role, landlord_id) VALUES (?, ?, 'tenant', ?)",
+                      ((f"7{i:08d}", f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}", rng.choice(landlord_ids))
+                       for i in range(tenants)))
+        c.execute("SELECT id, landlord_id FROM users WHERE role = 'tenant' ORDER BY id")
+        tenant_rows = c.fetchall()
+        tenants_by_landlord = {landlord_id: [] for landlord_id in landlord_ids}
+        for tenant_id, landlord_id in tenant_rows:
+            tenants_by_landlord[landlord_id].append(tenant_id)
+        # Each landlord's own group holds all of their tenants
+        group_ids = []
+        for landlord_id in landlord_ids:
+            group_id = db.add_group(f"Group of landlord {landlord_id}", landlord_id)
+            db.add_users_to_group(group_id, [landlord_id] + tenants_by_landlord[landlord_id])
+            group_ids.append(group_id)
+        for i in range(groups):
+            landlord_id = rng.choice(landlord_ids)
+            members = tenants_by_landlord[landlord_id]
+            group_id = db.add_group(f"Extra group {i}", landlord_id)
+            db.add_users_to_group(group_id, rng.sample(members, min(len(members), rng.randint(1, 50))))
+            group_ids.append(group_id)
+        db.initialize_rooms(rooms)
+        # About 80% of rooms are occupied, at most one room per tenant
+        occupied = rng.sample(range(1, rooms + 1), min(int(rooms * 0.8), len(tenant_rows)))
+        c.executemany("UPDATE rooms SET tenant_id = ? WHERE room_number = ?",
+                      ((tenant_id, str(room)) for (tenant_id, _), room in zip(tenant_rows, occupied)))
+        c.executemany("INSERT INTO statuses (user_id, status, timestamp) VALUES (?, ?, ?)",
+                      ((rng.choice(landlord_ids), random_text(rng), timestamp)
+                       for timestamp in timestamps(rng, statuses)))
+        # Messages go between tenants and their landlord, so inboxes look like the app's
+        def message_rows():
+            for timestamp in timestamps(rng, messages):
+                tenant_id, landlord_id = rng.choice(tenant_rows)
+                sender_id, recipient_id = (tenant_id, landlord_id) if rng.random() < 0.6 else (landlord_id, tenant_id)
+                yield (sender_id, recipient_id, random_text(rng), timestamp,
+                       DatabaseManager.conversation_key(sender_id, recipient_id))
+        c.executemany("""
+            INSERT INTO messages (sender_id, recipient_id, content, timestamp, conversation_key)
+            VALUES (?, ?, ?, ?, ?)
+        """, message_rows())
+    info = {
+        "landlord_ids": landlord_ids,
+        "tenants": tenant_rows,
+        "group_ids": group_ids,
+        "rooms": rooms,
+    }
+    return db, info
@@ -0,0 +1,123 @@
+# Times DatabaseManager methods on generated databases of several sizes and writes the
+# results as JSON, e.g.
+#   python -m benchmarks --sizes small medium --repeat 5 --output results.json
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from benchmarks.generate import SIZES, generate_database
+
+def benchmarks(db, info, rng):
+    # (name, callable) pairs; each callable performs one call of the method under test
+    landlord_id = info["landlord_ids"][0]
+    tenant_id, tenant_landlord_id = rng.choice(info["tenants"])
+    group_id = info["group_ids"][0]
+    phones = [row[0] for row in db._reader().execute("SELECT phone FROM users LIMIT 100")]
+    user_ids = [row[0] for row in info["tenants"][:100]]
+    room_counter = iter(range(10 ** 9))
+    
+    def provision_new_rooms():
+        start = next(room_counter) * 100
+        db.provision_rooms(start, start + 99, prefix="bench-")
+    
+    return [
+        ("get_user", lambda: db.get_user(rng.choice(user_ids))),
+        ("get_user_uncached", lambda: (db.invalidate_users(), db.get_user(rng.choice(user_ids)))),
+        ("get_users_100", lambda: (db.invalidate_users(), db.get_users(user_ids))),
+        ("get_user_by_phone", lambda: db.get_user_by_phone(rng.choice(phones))),
+        ("get_messages_between", lambda: db.get_messages_between(tenant_id, tenant_landlord_id)),
+        ("get_messages_page", lambda: db.get_messages_page(tenant_id, tenant_landlord_id)),
+        ("get_conversation_partners", lambda: db.get_conversation_partners(landlord_id)),
+        ("get_inbox", lambda: db.get_inbox(landlord_id)),
+        ("search_messages", lambda: db.search_messages(landlord_id, rng.choice(["rent", "water leak", "pay"]))),
+        ("get_status_feed", lambda: (db.invalidate_status_feed(), db.get_status_feed(landlord_id))),
+        ("get_statuses_for_group", lambda: db.get_statuses_for_group(landlord_id)),
+        ("get_group_members", lambda: db.get_group_members(group_id)),
+        ("get_groups_with_counts", db.get_groups_with_counts),
+        ("get_rooms", db.get_rooms),
+        ("get_rooms_with_tenants_page", lambda: db.get_rooms_with_tenants(limit=200)),
+        ("get_occupancy_series", db.get_occupancy_series),
+        ("add_message", lambda: db.add_message(tenant_id, tenant_landlord_id, "benchmark message")),
+        ("add_group_message", lambda: db.add_group_message(landlord_id, group_id, "benchmark broadcast")),
+        ("add_status", lambda: db.add_status(landlord_id, "benchmark status")),
+        ("initialize_rooms", lambda: db.initialize_rooms(info["rooms"])),
+        ("provision_rooms_100", provision_new_rooms),
+    ]
+
+def time_call(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        "runs": repeat,
+        "min_ms": min(samples),
+        "median_ms": statistics.median(samples),
+        "mean_ms": statistics.fmean(samples),
+        "max_ms": max(samples),
+    }
+
+def run(sizes, repeat=5, seed=0, only=None, workdir=None):
+    results = []
+    for size in sizes:
+        params = SIZES[size]
+        directory = tempfile.mkdtemp(prefix=f"bench-{size}-", dir=workdir)
+        try:
+            start = time.perf_counter()
+            db, info = generate_database(os.path.join(directory, "app.db"), seed=seed, **params)
+            generate_ms = (time.perf_counter() - start) * 1000
+            print(f"[{size}] generated in {generate_ms:.0f} ms", file=sys.stderr)
+            rng = random.Random(seed)
+            for name, fn in benchmarks(db, info, rng):
+                if only and name not in only:
+                    continue
+                fn()  # warm-up: first call pays for statement preparation and page faults
+                timing = time_call(fn, repeat)
+                results.append({"size": size, "method": name, **timing})
+                print(f"[{size}] {name}: median {timing['median_ms']:.3f} ms", file=sys.stderr)
+            db.close()
+            results.append({"size": size, "method": "generate_database", "runs": 1, "min_ms": generate_ms,
+                            "median_ms": generate_ms, "mean_ms": generate_ms, "max_ms": generate_ms})
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+    return {
+        "meta": {
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "seed": seed,
+            "repeat": repeat,
+            "sizes": {size: SIZES[size] for size in sizes},
+        },
+        "results": results,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark DatabaseManager on synthetic data")
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=["small", "medium"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="+", help="benchmark names to run")
+    parser.add_argument("--workdir", help="directory for the temporary databases")
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+    report = run(args.sizes, repeat=args.repeat, seed=args.seed, only=args.only, workdir=args.workdir)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+if __name__ == "__main__":
+    main()
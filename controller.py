@@ -1,26 +1,38 @@
 # controller.py
+import os
 import sys
 from model import DatabaseManager
 from view.login_view import LoginView
-from view.main_view import MainView
 from PyQt6.QtWidgets import QApplication, QDialog
+from PyQt6.QtCore import QTimer
+from utilities import startup_mark
 
 class AppController:
     def __init__(self):
-        self.db_manager = DatabaseManager()
+        self.db_manager = DatabaseManager(pooled=True)
+        # APP_DB_PROFILE=<file.json> turns on query instrumentation and writes a snapshot on exit
+        self.profile_path = os.environ.get("APP_DB_PROFILE")
+        if self.profile_path:
+            self.db_manager.enable_instrumentation(slow_ms=float(os.environ.get("APP_DB_SLOW_MS", 50)))
     
     def run(self):
         app = QApplication(sys.argv)
         
-        login = LoginView()
+        login = LoginView(self.db_manager)
         login.login_button.clicked.connect(lambda: self.process_login(login))
+        QTimer.singleShot(0, lambda: startup_mark("login dialog shown"))
         if login.exec() == QDialog.DialogCode.Accepted:
+            from view.main_view import MainView  # deferred until after login
             user_id = login.user_id
             user_name = login.name_input.text().strip()
             user_role = login.role_combo.currentText().lower()
+            startup_mark("login accepted")
             main_view = MainView(user_id, user_name, user_role, self.db_manager)
             main_view.show()
+            QTimer.singleShot(0, lambda: startup_mark("main window shown"))
             app.exec()
+        if self.profile_path:
+            self.db_manager.instrumentation.export(self.profile_path)
     
     def process_login(self, login_view):
         # Process login data; this function is called when login_button is pressed.
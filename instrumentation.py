@@ -0,0 +1,297 @@
+import bisect
+import collections
+import inspect
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+HISTOGRAM_BOUNDS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000)
+
+# DatabaseManager attributes that are not wrapped: plumbing, static helpers and
+# methods whose cost is not a query
+UNWRAPPED = {"transaction", "close", "migrations", "create_tables", "conversation_key",
+             "group_conversation_key", "fts_query", "enable_instrumentation",
+             "disable_instrumentation"}
+
+# Statements FTS5 runs against its shadow tables to refresh its configuration. They are
+# traced as ordinary SQL on the connection but belong to the statement that touched the index
+FTS_INTERNAL = re.compile(r"^PRAGMA '\w+'\.data_version$|'\w+_fts_\w+'")
+
+# String and blob literals. The trace callback sees statements with their parameters
+# filled in, so message bodies and passwords would otherwise reach the log and exports
+LITERAL = re.compile(r"[xX]?'(?:[^']|'')*'")
+
+def normalize(sql):
+    return LITERAL.sub("?", " ".join(sql.split()))
+
+class MethodStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.statements = 0
+        self.max_statements = 0
+        self.histogram = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+    
+    def record(self, elapsed_ms, statements, failed):
+        self.calls += 1
+        self.errors += failed
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.statements += statements
+        self.max_statements = max(self.max_statements, statements)
+        self.histogram[bisect.bisect_left(HISTOGRAM_BOUNDS_MS, elapsed_ms)] += 1
+    
+    def as_dict(self):
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "total_ms": round(self.total_ms, 3),
+            "mean_ms": round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            # A high statements-per-call figure is the signature of an N+1 loop
+            "statements": self.statements,
+            "statements_per_call": round(self.statements / self.calls, 2) if self.calls else 0.0,
+            "max_statements": self.max_statements,
+            "histogram": dict(zip([f"<={bound}ms" for bound in HISTOGRAM_BOUNDS_MS] + ["inf"], self.histogram)),
+        }
+
+class Instrumentation:
+    # Opt-in profiling for one DatabaseManager. Public methods are wrapped with timers,
+    # and every connection gets a trace callback that attributes statements to the
+    # innermost wrapped method on the same thread. A statement's duration is measured
+    # from its trace to the next statement or the end of the method, so it includes
+    # fetching its rows. Statements slower than slow_ms are logged with their query plan,
+    # with string and blob literals replaced by ?
+    SLOW_LOG_SIZE = 200
+    
+    def __init__(self, db_manager, slow_ms=50.0):
+        self.db_manager = db_manager
+        self.slow_ms = slow_ms
+        self.started = time.time()
+        self.methods = collections.defaultdict(MethodStats)
+        self.slow_queries = collections.deque(maxlen=self.SLOW_LOG_SIZE)
+        self.untracked_statements = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._explain_conn = None
+        self._explain_lock = threading.Lock()
+        self._connections = []
+        self._installed = False
+    
+    def install(self):
+        if self._installed:
+            return self
+        db = self.db_manager
+        for name in dir(type(db)):
+            if name.startswith("_") or name in UNWRAPPED:
+                continue
+            attribute = getattr(db, name)
+            if inspect.isgeneratorfunction(attribute):
+                setattr(db, name, self._wrap_generator(name, attribute))
+            elif callable(attribute) and not isinstance(attribute, type):
+                setattr(db, name, self._wrap(name, attribute))
+        # New per-thread readers are traced too
+        original_connect = db._connect
+        def connect(writer=False):
+            conn = original_connect(writer)
+            self._trace(conn)
+            return conn
+        db._connect = connect
+        self._trace(db.conn)
+        with db._readers_lock:
+            for conn in db._readers:
+                self._trace(conn)
+        self._installed = True
+        return self
+    
+    def uninstall(self):
+        if not self._installed:
+            return
+        db = self.db_manager
+        for name in list(vars(db)):
+            if getattr(getattr(db, name), "__instrumented__", False) or name == "_connect":
+                delattr(db, name)
+        for conn in self._connections:
+            try:
+                conn.set_trace_callback(None)
+            except sqlite3.ProgrammingError:
+                pass  # already closed
+        self._connections = []
+        with self._explain_lock:
+            if self._explain_conn is not None:
+                self._explain_conn.close()
+                self._explain_conn = None
+        self._installed = False
+    
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self.methods.clear()
+            self.slow_queries.clear()
+            self.untracked_statements = 0
+    
+    def _trace(self, conn):
+        conn.set_trace_callback(self._on_statement)
+        self._connections.append(conn)
+    
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+    
+    def _enter(self, frame):
+        stack = self._stack()
+        if stack:
+            self._close_statement(stack[-1])
+        stack.append(frame)
+        return stack
+    
+    def _leave(self, stack, frame):
+        self._close_statement(frame)
+        stack.pop()
+    
+    def _record(self, name, frame, elapsed_ms, failed):
+        with self._lock:
+            self.methods[name].record(elapsed_ms, frame["statements"], failed)
+        for sql, statement_ms in frame["slow"]:
+            self._log_slow(name, sql, statement_ms)
+    
+    def _wrap(self, name, method):
+        def wrapper(*args, **kwargs):
+            frame = {"method": name, "statements": 0, "pending": None, "slow": []}
+            stack = self._enter(frame)
+            failed = False
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            except BaseException:
+                failed = True
+                raise
+            finally:
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                self._leave(stack, frame)
+                self._record(name, frame, elapsed_ms, failed)
+        wrapper.__instrumented__ = True
+        wrapper.__name__ = name
+        wrapper.__wrapped__ = method
+        return wrapper
+    
+    def _wrap_generator(self, name, method):
+        # Generators run their queries while being iterated, not when called. The frame is
+        # entered on every resume and left at every yield, so the call's time and statements
+        # cover the iteration but not the caller's work between items
+        def wrapper(*args, **kwargs):
+            frame = {"method": name, "statements": 0, "pending": None, "slow": []}
+            iterator = method(*args, **kwargs)
+            failed = False
+            elapsed_ms = 0.0
+            try:
+                while True:
+                    stack = self._enter(frame)
+                    start = time.perf_counter()
+                    try:
+                        item = next(iterator)
+                    except StopIteration:
+                        return
+                    finally:
+                        elapsed_ms += (time.perf_counter() - start) * 1000
+                        self._leave(stack, frame)
+                    yield item
+            except GeneratorExit:
+                raise
+            except BaseException:
+                failed = True
+                raise
+            finally:
+                # A consumer that stops early still runs the generator's cleanup in the frame
+                stack = self._enter(frame)
+                start = time.perf_counter()
+                try:
+                    iterator.close()
+                finally:
+                    elapsed_ms += (time.perf_counter() - start) * 1000
+                    self._leave(stack, frame)
+                    self._record(name, frame, elapsed_ms, failed)
+        wrapper.__instrumented__ = True
+        wrapper.__name__ = name
+        wrapper.__wrapped__ = method
+        return wrapper
+    
+    def _on_statement(self, sql):
+        if FTS_INTERNAL.search(sql):
+            return
+        stack = self._stack()
+        if not stack:
+            with self._lock:
+                self.untracked_statements += 1
+            return
+        frame = stack[-1]
+        pending = frame["pending"]
+        if sql.startswith("--") or (pending is not None and pending[0] == sql):
+            # Statements run by virtual tables are reported as comments, and trigger
+            # bodies with the text of the statement that fired them
+            return
+        frame["statements"] += 1
+        self._close_statement(frame)
+        frame["pending"] = (sql, time.perf_counter())
+    
+    def _close_statement(self, frame):
+        pending = frame["pending"]
+        if pending is None:
+            return
+        sql, start = pending
+        frame["pending"] = None
+        statement_ms = (time.perf_counter() - start) * 1000
+        if statement_ms >= self.slow_ms:
+            frame["slow"].append((normalize(sql), statement_ms))
+    
+    def _log_slow(self, method, sql, statement_ms):
+        plan = self.explain(sql)
+        entry = {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "method": method,
+            "ms": round(statement_ms, 3),
+            "sql": sql,
+            "plan": plan,
+        }
+        with self._lock:
+            self.slow_queries.append(entry)
+        logger.warning("slow query in %s (%.1f ms): %s\n%s", method, statement_ms, entry["sql"],
+                       "\n".join(plan) if plan else "(no plan)")
+    
+    def explain(self, sql):
+        # EXPLAIN QUERY PLAN on a separate read-only connection; never executes the statement.
+        # Placeholders left by normalize() are bound to NULL
+        with self._explain_lock:
+            if self._explain_conn is None:
+                self._explain_conn = sqlite3.connect(self.db_manager.db_name, check_same_thread=False)
+                self._explain_conn.execute("PRAGMA query_only = ON")
+            try:
+                rows = self._explain_conn.execute("EXPLAIN QUERY PLAN " + sql, (None,) * sql.count("?")).fetchall()
+            except sqlite3.Error:
+                return []
+        return [row[-1] for row in rows]
+    
+    def snapshot(self):
+        with self._lock:
+            return {
+                "started": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started)),
+                "taken": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "slow_ms": self.slow_ms,
+                "methods": {name: stats.as_dict() for name, stats in sorted(self.methods.items())},
+                "untracked_statements": self.untracked_statements,
+                "slow_queries": list(self.slow_queries),
+            }
+    
+    def export(self, path):
+        with open(path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
@@ -1,4 +1,5 @@
 # main.py
+import utilities  # first, so startup timing starts as early as possible
 from controller import AppController
 
 if __name__ == "__main__":
@@ -0,0 +1,139 @@
+# manage.py
+# Headless maintenance commands; never imports PyQt6. Examples:
+#   python manage.py import-users tenants.csv
+#   python manage.py import-rooms rooms.jsonl
+#   python manage.py import-assignments assignments.csv
+#   python manage.py export-messages --output messages.jsonl
+#   python manage.py export-statuses --format csv
+# CSV files need a header row; JSONL files hold one object per line with the same keys:
+#   users:       phone, name, role, landlord_phone (tenants), password (landlords)
+#   rooms:       room_number
+#   assignments: room_number, tenant_phone
+import argparse
+import csv
+import itertools
+import json
+import sys
+import time
+from model import DatabaseManager
+
+CHUNK_SIZE = 5000
+
+def read_records(path, file_format=None):
+    # Yields dicts from a CSV or JSONL file ("-" is stdin), one line at a time
+    file_format = file_format or ("jsonl" if path.endswith((".jsonl", ".json")) else "csv")
+    f = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+    try:
+        if file_format == "csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def import_stream(label, rows, load, chunk_size):
+    # Feeds rows to load() chunk by chunk; each chunk is one transaction
+    start = time.perf_counter()
+    read = written = 0
+    for chunk in chunked(rows, chunk_size):
+        read += len(chunk)
+        written += load(chunk)
+        print(f"{label}: {read} read, {written} written", file=sys.stderr)
+    print(f"{label}: done in {time.perf_counter() - start:.2f} s", file=sys.stderr)
+
+def user_rows(records):
+    for record in records:
+        role = (record.get("role") or "tenant").strip().lower()
+        if role not in ("tenant", "landlord"):
+            raise ValueError(f"Unknown role {role!r} for phone {record.get('phone')}")
+        if role == "landlord" and not record.get("password"):
+            raise ValueError(f"Password required for landlord {record.get('phone')}")
+        if role == "tenant" and not str(record.get("landlord_phone") or "").strip():
+            raise ValueError(f"Landlord phone required for tenant {record.get('phone')}")
+        yield (str(record["phone"]).strip(), record["name"].strip(), role,
+               str(record.get("landlord_phone") or "").strip() or None, record.get("password") or None)
+
+def write_records(rows, columns, output, file_format):
+    # Streams rows to a CSV or JSONL file ("-" is stdout)
+    f = sys.stdout if output == "-" else open(output, "w", newline="", encoding="utf-8")
+    try:
+        if file_format == "csv":
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            writer.writerows(rows)
+        else:
+            for row in rows:
+                f.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n")
+    finally:
+        if f is not sys.stdout:
+            f.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import/export for the apartment app")
+    parser.add_argument("--db", default="app.db")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name in ("import-users", "import-rooms", "import-assignments"):
+        command = commands.add_parser(name)
+        command.add_argument("file", help='CSV or JSONL file, or "-" for stdin')
+        command.add_argument("--format", choices=["csv", "jsonl"])
+        command.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    for name in ("export-users", "export-messages", "export-statuses"):
+        command = commands.add_parser(name)
+        command.add_argument("--output", default="-")
+        command.add_argument("--format", choices=["csv", "jsonl"], default="jsonl")
+        if name == "export-statuses":
+            command.add_argument("--landlord-phone")
+    command = commands.add_parser("archive-messages")
+    command.add_argument("--older-than-days", type=int, default=365)
+    args = parser.parse_args(argv)
+    
+    db_manager = DatabaseManager(args.db, pooled=True)
+    try:
+        if args.command == "import-users":
+            import_stream("users", user_rows(read_records(args.file, args.format)),
+                          db_manager.add_users_bulk, args.chunk_size)
+        elif args.command == "import-rooms":
+            rooms = (str(record["room_number"]).strip() for record in read_records(args.file, args.format))
+            import_stream("rooms", rooms, db_manager.add_rooms_bulk, args.chunk_size)
+        elif args.command == "import-assignments":
+            assignments = ((str(record["room_number"]).strip(), str(record["tenant_phone"]).strip())
+                           for record in read_records(args.file, args.format))
+            import_stream("assignments", assignments, db_manager.assign_rooms_by_phone, args.chunk_size)
+        elif args.command == "export-users":
+            write_records(db_manager.iter_users(), ("id", "phone", "name", "role", "landlord_phone"),
+                          args.output, args.format)
+        elif args.command == "export-messages":
+            write_records(db_manager.iter_messages(),
+                          ("id", "timestamp", "sender_phone", "sender_name", "recipient_phone", "group_id", "content"),
+                          args.output, args.format)
+        elif args.command == "export-statuses":
+            owner_id = None
+            if args.landlord_phone:
+                landlord = db_manager.get_user_by_phone(args.landlord_phone)
+                if not landlord:
+                    parser.error(f"no user with phone {args.landlord_phone}")
+                owner_id = landlord[0]
+            write_records(db_manager.iter_statuses(owner_id),
+                          ("id", "timestamp", "landlord_phone", "landlord_name", "status"), args.output, args.format)
+        elif args.command == "archive-messages":
+            moved = db_manager.archive_messages(older_than_days=args.older_than_days)
+            print(f"archived {moved} messages", file=sys.stderr)
+    except (ValueError, KeyError) as e:
+        # Chunks committed before the bad record stay imported; re-running skips them
+        sys.exit(f"error: {e}")
+    finally:
+        db_manager.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,173 +1,1215 @@
+import os
+import queue
+import re
 import sqlite3
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from attachments import AttachmentStore
+from thumbnails import ThumbnailCache
 
 class DatabaseManager:
-    def __init__(self, db_name="app.db"):
-        self.conn = sqlite3.connect(db_name)
+    BACKFILL_BATCH_SIZE = 50000
+    CHANGE_TOPICS = ("messages", "statuses", "rooms")
+    STATUS_PAGE_SIZE = 20
+    USER_CACHE_SIZE = 1024
+    ARCHIVE_BATCH_SIZE = 5000
+    # Seconds a cached user row is trusted; bounds staleness from other connections
+    USER_CACHE_TTL = 30.0
+    
+    def __init__(self, db_name="app.db", pooled=False):
+        self.db_name = db_name
+        # Pooled mode: WAL journaling, one read connection per thread and a single
+        # serialized writer (self.conn), so DB work can run off the GUI thread
+        self.pooled = pooled
+        self._local = threading.local()
+        self._readers = []
+        self._readers_lock = threading.Lock()
+        self._write_lock = threading.RLock()
+        self._write_depth = 0
+        # Newest status page per landlord, shared by every tab in this process
+        self._status_feed_cache = {}
+        self._status_feed_lock = threading.Lock()
+        # Read-through caches for get_user / get_user_by_phone
+        self._users_by_id = TTLCache(self.USER_CACHE_SIZE, self.USER_CACHE_TTL)
+        self._users_by_phone = TTLCache(self.USER_CACHE_SIZE, self.USER_CACHE_TTL)
+        self.attachment_store = AttachmentStore.for_database(db_name)
+        self.thumbnail_cache = ThumbnailCache.for_database(db_name)
+        self.conn = self._connect(writer=True)
         self.create_tables()
     
+    def _connect(self, writer=False):
+        if not self.pooled:
+            return sqlite3.connect(self.db_name)
+        # Readers are only used by their own thread but may be closed from another
+        conn = sqlite3.connect(self.db_name, timeout=5.0, check_same_thread=False)
+        conn.execute("PRAGMA busy_timeout = 5000")
+        conn.execute("PRAGMA cache_size = -16000")
+        if writer:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+        else:
+            conn.execute("PRAGMA query_only = ON")
+        return conn
+    
+    def _reader(self):
+        # Cursor for read-only statements
+        if not self.pooled:
+            return self.conn.cursor()
+        holder = getattr(self._local, "reader", None)
+        if holder is None:
+            conn = self._connect()
+            holder = self._local.reader = ReaderHolder(conn)
+            with self._readers_lock:
+                self._readers.append(conn)
+            # Pool threads come and go (QThreadPool expires idle ones); the holder dies
+            # with its thread's locals, and the connection is closed with it
+            weakref.finalize(holder, self._release_reader, self._readers, self._readers_lock, conn)
+        return holder.conn.cursor()
+    
+    @staticmethod
+    def _release_reader(readers, readers_lock, conn):
+        with readers_lock:
+            if conn in readers:
+                readers.remove(conn)
+        conn.close()
+    
+    @contextmanager
+    def transaction(self):
+        # Cursor on the single write connection. Everything inside the block commits once
+        # at the outermost level; a nested transaction() that raises rolls back only its
+        # own savepoint. The outermost level begins IMMEDIATE: a deferred transaction that
+        # reads first cannot upgrade to a write once another connection has committed (WAL
+        # returns SQLITE_BUSY at once), while IMMEDIATE takes the write lock up front and
+        # waits on busy_timeout
+        with self._write_lock:
+            self._write_depth += 1
+            savepoint = f"sp_{self._write_depth}" if self._write_depth > 1 else None
+            if savepoint:
+                self.conn.execute(f"SAVEPOINT {savepoint}")
+            elif not self.conn.in_transaction:
+                self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn.cursor()
+            except BaseException:
+                if savepoint:
+                    self.conn.execute(f"ROLLBACK TO {savepoint}")
+                    self.conn.execute(f"RELEASE {savepoint}")
+                else:
+                    self.conn.rollback()
+                raise
+            else:
+                if savepoint:
+                    self.conn.execute(f"RELEASE {savepoint}")
+                else:
+                    self.conn.commit()
+            finally:
+                self._write_depth -= 1
+    
+    def close(self):
+        with self._readers_lock:
+            for conn in self._readers:
+                conn.close()
+            self._readers.clear()
+        with self._write_lock:
+            self.conn.close()
+    
+    # Schema migrations, applied in order and tracked in PRAGMA user_version.
+    # Each one is idempotent so databases created before versioning upgrade cleanly.
+    def migrations(self):
+        return [
+            self._migrate_base_schema,
+            self._migrate_conversation_key,
+            self._migrate_conversations,
+            self._migrate_room_order,
+            self._migrate_message_search,
+            self._migrate_change_log,
+            self._migrate_occupancy_history,
+            self._migrate_group_members_key,
+            self._migrate_group_messages,
+            self._migrate_attachments,
+            self._migrate_profile_pic_hash,
+            self._migrate_message_archive,
+            self._migrate_tenant_name_index,
+        ]
+    
     def create_tables(self):
+        # Applies pending migrations; once the schema is current this is a single PRAGMA read
         c = self.conn.cursor()
-        # Users table: includes role and landlord_id (if tenant)
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                phone TEXT UNIQUE,
-                name TEXT,
-                profile_pic TEXT,
-                role TEXT,
-                landlord_id INTEGER
-            )
-        """)
-        # Migration: add password column if it doesn't exist
-        c.execute("PRAGMA table_info(users)")
-        columns = [info[1] for info in c.fetchall()]
-        if "password" not in columns:
-            c.execute("ALTER TABLE users ADD COLUMN password TEXT")
-        # Messages table: store sender and recipient
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS messages (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                sender_id INTEGER,
-                recipient_id INTEGER,
-                content TEXT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY(sender_id) REFERENCES users(id),
-                FOREIGN KEY(recipient_id) REFERENCES users(id)
-            )
-        """)
-        # Statuses: for landlords
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS statuses (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                status TEXT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY(user_id) REFERENCES users(id)
-            )
-        """)
-        # Groups: each landlord has one group
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS groups (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT,
-                owner_id INTEGER,
-                FOREIGN KEY(owner_id) REFERENCES users(id)
-            )
-        """)
-        # Group members linking tenants to a landlord’s group
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS group_members (
-                group_id INTEGER,
-                user_id INTEGER,
-                FOREIGN KEY(group_id) REFERENCES groups(id),
-                FOREIGN KEY(user_id) REFERENCES users(id)
-            )
+        c.execute("PRAGMA user_version")
+        version = c.fetchone()[0]
+        migrations = self.migrations()
+        for number, migration in enumerate(migrations[version:], start=version + 1):
+            migration()
+            with self.transaction() as c:
+                c.execute(f"PRAGMA user_version = {number}")
+    
+    def _table_exists(self, c, name):
+        c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,))
+        return c.fetchone() is not None
+    
+    def _column_exists(self, c, table, column):
+        c.execute(f"PRAGMA table_info({table})")
+        return column in [info[1] for info in c.fetchall()]
+    
+    def _backfill_in_batches(self, table, sql):
+        # Runs `sql` over rowid windows [:lo, :hi) of `table`, one short transaction per
+        # window, so upgrading a large database never holds a long write lock
+        c = self.conn.cursor()
+        c.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {table}")
+        max_rowid = c.fetchone()[0]
+        for lo in range(0, max_rowid + 1, self.BACKFILL_BATCH_SIZE):
+            with self.transaction() as c:
+                c.execute(sql, {"lo": lo, "hi": lo + self.BACKFILL_BATCH_SIZE})
+    
+    def _migrate_base_schema(self):
+        with self.transaction() as c:
+            # Users table: includes role and landlord_id (if tenant)
+            c.execute("""
+                CREATE TABLE IF NOT EXISTS users (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    phone TEXT UNIQUE,
+                    name TEXT,
+                    profile_pic TEXT,
+                    role TEXT,
+                    landlord_id INTEGER
+                )
+            """)
+            # Add password column if it doesn't exist
+            if not self._column_exists(c, "users", "password"):
+                c.execute("ALTER TABLE users ADD COLUMN password TEXT")
+            # Messages table: store sender and recipient
+            c.execute("""
+                CREATE TABLE IF NOT EXISTS messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    sender_id INTEGER,
+                    recipient_id INTEGER,
+                    content TEXT,
+                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY(sender_id) REFERENCES users(id),
+                    FOREIGN KEY(recipient_id) REFERENCES users(id)
+                )
+            """)
+            # Statuses: for landlords
+            c.execute("""
+                CREATE TABLE IF NOT EXISTS statuses (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER,
+                    status TEXT,
+                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY(user_id) REFERENCES users(id)
+                )
+            """)
+            # Groups: each landlord has one group
+            c.execute("""
+                CREATE TABLE IF NOT EXISTS groups (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT,
+                    owner_id INTEGER,
+                    FOREIGN KEY(owner_id) REFERENCES users(id)
+                )
+            """)
+            # Group members linking tenants to a landlord’s group
+            c.execute("""
+                CREATE TABLE IF NOT EXISTS group_members (
+                    group_id INTEGER,
+                    user_id INTEGER,
+                    FOREIGN KEY(group_id) REFERENCES groups(id),
+                    FOREIGN KEY(user_id) REFERENCES users(id)
+                )
+            """)
+            # Rooms for apartment management
+            c.execute("""
+                CREATE TABLE IF NOT EXISTS rooms (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    room_number TEXT UNIQUE,
+                    tenant_id INTEGER,
+                    FOREIGN KEY(tenant_id) REFERENCES users(id)
+                )
+            """)
+    
+    def _migrate_conversation_key(self):
+        # Order-independent conversation key so a thread read is an index range scan
+        with self.transaction() as c:
+            if not self._column_exists(c, "messages", "conversation_key"):
+                c.execute("ALTER TABLE messages ADD COLUMN conversation_key TEXT")
+        self._backfill_in_batches("messages", """
+            UPDATE messages
+            SET conversation_key = MIN(sender_id, recipient_id) || ':' || MAX(sender_id, recipient_id)
+            WHERE id >= :lo AND id < :hi AND conversation_key IS NULL
         """)
-        # Rooms for apartment management
+        with self.transaction() as c:
+            c.execute("CREATE INDEX IF NOT EXISTS idx_messages_conversation ON messages (conversation_key, timestamp, id)")
+            c.execute("CREATE INDEX IF NOT EXISTS idx_statuses_user ON statuses (user_id, timestamp)")
+            c.execute("CREATE INDEX IF NOT EXISTS idx_groups_owner ON groups (owner_id)")
+            c.execute("CREATE INDEX IF NOT EXISTS idx_rooms_tenant ON rooms (tenant_id)")
+    
+    def _migrate_conversations(self):
+        with self.transaction() as c:
+            backfill = not self._table_exists(c, "conversations")
+            # Conversations: per-user inbox summary kept current by a trigger on messages
+            c.execute("""
+                CREATE TABLE IF NOT EXISTS conversations (
+                    user_id INTEGER,
+                    partner_id INTEGER,
+                    last_message_id INTEGER,
+                    last_content TEXT,
+                    last_timestamp DATETIME,
+                    unread_count INTEGER DEFAULT 0,
+                    PRIMARY KEY (user_id, partner_id)
+                )
+            """)
+            c.execute("CREATE INDEX IF NOT EXISTS idx_conversations_recent ON conversations (user_id, last_message_id)")
+            # Read markers: last message each user has seen in a conversation. unread_count
+            # is a cache of the messages after this marker; recount_unread() rebuilds it
+            c.execute("""
+                CREATE TABLE IF NOT EXISTS conversation_reads (
+                    user_id INTEGER,
+                    partner_id INTEGER,
+                    last_read_id INTEGER,
+                    PRIMARY KEY (user_id, partner_id)
+                )
+            """)
+            c.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_messages_conversations AFTER INSERT ON messages
+                BEGIN
+                    INSERT OR IGNORE INTO conversations (user_id, partner_id) VALUES (NEW.sender_id, NEW.recipient_id);
+                    INSERT OR IGNORE INTO conversations (user_id, partner_id) VALUES (NEW.recipient_id, NEW.sender_id);
+                    UPDATE conversations
+                    SET last_message_id = NEW.id, last_content = NEW.content, last_timestamp = NEW.timestamp
+                    WHERE (user_id = NEW.sender_id AND partner_id = NEW.recipient_id)
+                       OR (user_id = NEW.recipient_id AND partner_id = NEW.sender_id);
+                    UPDATE conversations
+                    SET unread_count = unread_count + 1
+                    WHERE user_id = NEW.recipient_id AND partner_id = NEW.sender_id AND NEW.sender_id != NEW.recipient_id;
+                END
+            """)
+        if backfill:
+            # Existing history is treated as already read
+            self._backfill_in_batches("messages", """
+                INSERT INTO conversations (user_id, partner_id, last_message_id)
+                SELECT user_id, partner_id, MAX(id)
+                FROM (
+                    SELECT sender_id AS user_id, recipient_id AS partner_id, id
+                    FROM messages WHERE id >= :lo AND id < :hi
+                    UNION ALL
+                    SELECT recipient_id, sender_id, id
+                    FROM messages WHERE id >= :lo AND id < :hi
+                )
+                WHERE true
+                GROUP BY user_id, partner_id
+                ON CONFLICT (user_id, partner_id)
+                DO UPDATE SET last_message_id = MAX(last_message_id, excluded.last_message_id)
+            """)
+            self._backfill_in_batches("conversations", """
+                UPDATE conversations
+                SET last_content = (SELECT content FROM messages WHERE id = last_message_id),
+                    last_timestamp = (SELECT timestamp FROM messages WHERE id = last_message_id)
+                WHERE rowid >= :lo AND rowid < :hi
+            """)
+            self._backfill_in_batches("conversations", """
+                INSERT OR IGNORE INTO conversation_reads (user_id, partner_id, last_read_id)
+                SELECT user_id, partner_id, last_message_id FROM conversations
+                WHERE rowid >= :lo AND rowid < :hi
+            """)
+    
+    def _migrate_room_order(self):
+        with self.transaction() as c:
+            c.execute("CREATE INDEX IF NOT EXISTS idx_rooms_order ON rooms (CAST(room_number AS INTEGER), room_number)")
+    
+    def _migrate_message_search(self):
+        # Full-text index over messages.content, kept in sync by triggers
+        with self.transaction() as c:
+            backfill = not self._table_exists(c, "messages_fts")
+            c.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts
+                USING fts5(content, content='messages', content_rowid='id')
+            """)
+            c.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_messages_fts_insert AFTER INSERT ON messages
+                BEGIN
+                    INSERT INTO messages_fts (rowid, content) VALUES (NEW.id, NEW.content);
+                END
+            """)
+            c.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_messages_fts_delete AFTER DELETE ON messages
+                BEGIN
+                    INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', OLD.id, OLD.content);
+                END
+            """)
+            c.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_messages_fts_update AFTER UPDATE OF content ON messages
+                BEGIN
+                    INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', OLD.id, OLD.content);
+                    INSERT INTO messages_fts (rowid, content) VALUES (NEW.id, NEW.content);
+                END
+            """)
+        if backfill:
+            self._backfill_in_batches("messages", """
+                INSERT INTO messages_fts (rowid, content)
+                SELECT id, content FROM messages WHERE id >= :lo AND id < :hi
+            """)
+    
+    def _migrate_change_log(self):
+        # Monotonic per-topic change counters bumped by triggers, so any connection
+        # can tell which kind of data another one changed
+        with self.transaction() as c:
+            c.execute("""
+                CREATE TABLE IF NOT EXISTS change_log (
+                    topic TEXT PRIMARY KEY,
+                    seq INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            c.executemany("INSERT OR IGNORE INTO change_log (topic) VALUES (?)",
+                          [(topic,) for topic in self.CHANGE_TOPICS])
+            for table, event in [("messages", "INSERT"), ("statuses", "INSERT"),
+                                 ("rooms", "INSERT"), ("rooms", "UPDATE"), ("rooms", "DELETE")]:
+                c.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS trg_{table}_change_{event.lower()} AFTER {event} ON {table}
+                    BEGIN
+                        UPDATE change_log SET seq = seq + 1 WHERE topic = '{table}';
+                    END
+                """)
+    
+    def _migrate_occupancy_history(self):
+        with self.transaction() as c:
+            # Occupancy snapshots: one row per assignment/vacancy plus full recounts
+            c.execute("""
+                CREATE TABLE IF NOT EXISTS occupancy_snapshots (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    taken_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    occupied INTEGER,
+                    total INTEGER
+                )
+            """)
+            c.execute("CREATE INDEX IF NOT EXISTS idx_occupancy_snapshots_taken ON occupancy_snapshots (taken_at)")
+            # Daily rollups the dashboard reads
+            c.execute("""
+                CREATE TABLE IF NOT EXISTS occupancy_daily (
+                    day TEXT PRIMARY KEY,
+                    occupied_min INTEGER,
+                    occupied_max INTEGER,
+                    occupied_avg REAL,
+                    occupied_close INTEGER,
+                    total INTEGER
+                )
+            """)
+            # Assignments and vacancies adjust the latest snapshot's counts, so recording
+            # is O(1) and covers every writer
+            c.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_rooms_occupancy AFTER UPDATE OF tenant_id ON rooms
+                WHEN (OLD.tenant_id IS NULL) != (NEW.tenant_id IS NULL)
+                BEGIN
+                    INSERT INTO occupancy_snapshots (occupied, total)
+                    SELECT occupied + (NEW.tenant_id IS NOT NULL) - (OLD.tenant_id IS NOT NULL), total
+                    FROM occupancy_snapshots
+                    ORDER BY id DESC
+                    LIMIT 1;
+                END
+            """)
+            self._record_occupancy(c)
+    
+    def _migrate_group_members_key(self):
+        # Rebuild group_members with a (group_id, user_id) primary key, dropping duplicates
+        with self.transaction() as c:
+            c.execute("PRAGMA table_info(group_members)")
+            rebuild = not any(info[5] for info in c.fetchall())
+            if rebuild:
+                c.execute("DROP TABLE IF EXISTS group_members_new")
+                c.execute("""
+                    CREATE TABLE group_members_new (
+                        group_id INTEGER,
+                        user_id INTEGER,
+                        PRIMARY KEY (group_id, user_id),
+                        FOREIGN KEY(group_id) REFERENCES groups(id),
+                        FOREIGN KEY(user_id) REFERENCES users(id)
+                    ) WITHOUT ROWID
+                """)
+        if rebuild:
+            self._backfill_in_batches("group_members", """
+                INSERT OR IGNORE INTO group_members_new (group_id, user_id)
+                SELECT group_id, user_id FROM group_members WHERE rowid >= :lo AND rowid < :hi
+            """)
+        with self.transaction() as c:
+            if rebuild:
+                c.execute("DROP TABLE group_members")
+                c.execute("ALTER TABLE group_members_new RENAME TO group_members")
+            c.execute("CREATE INDEX IF NOT EXISTS idx_group_members_user ON group_members (user_id)")
+            c.execute("CREATE INDEX IF NOT EXISTS idx_users_landlord ON users (landlord_id)")
+            # Member count kept on the group by triggers
+            if not self._column_exists(c, "groups", "member_count"):
+                c.execute("ALTER TABLE groups ADD COLUMN member_count INTEGER NOT NULL DEFAULT 0")
+            c.execute("""
+                UPDATE groups
+                SET member_count = (SELECT COUNT(*) FROM group_members WHERE group_id = groups.id)
+            """)
+            c.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_group_members_insert AFTER INSERT ON group_members
+                BEGIN
+                    UPDATE groups SET member_count = member_count + 1 WHERE id = NEW.group_id;
+                END
+            """)
+            c.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_group_members_delete AFTER DELETE ON group_members
+                BEGIN
+                    UPDATE groups SET member_count = member_count - 1 WHERE id = OLD.group_id;
+                END
+            """)
+    
+    def _migrate_group_messages(self):
+        # Group messages are stored once in messages with group_id set, recipient_id NULL
+        # and conversation_key 'g:<group_id>'; members read them through group_members
+        with self.transaction() as c:
+            if not self._column_exists(c, "messages", "group_id"):
+                c.execute("ALTER TABLE messages ADD COLUMN group_id INTEGER")
+            if not self._column_exists(c, "groups", "last_message_id"):
+                c.execute("ALTER TABLE groups ADD COLUMN last_message_id INTEGER")
+            # Per-member read cursor
+            c.execute("""
+                CREATE TABLE IF NOT EXISTS group_reads (
+                    group_id INTEGER,
+                    user_id INTEGER,
+                    last_read_id INTEGER,
+                    PRIMARY KEY (group_id, user_id)
+                ) WITHOUT ROWID
+            """)
+            # One-to-one inbox summaries must ignore group messages
+            c.execute("DROP TRIGGER IF EXISTS trg_messages_conversations")
+            c.execute("""
+                CREATE TRIGGER trg_messages_conversations AFTER INSERT ON messages
+                WHEN NEW.group_id IS NULL
+                BEGIN
+                    INSERT OR IGNORE INTO conversations (user_id, partner_id) VALUES (NEW.sender_id, NEW.recipient_id);
+                    INSERT OR IGNORE INTO conversations (user_id, partner_id) VALUES (NEW.recipient_id, NEW.sender_id);
+                    UPDATE conversations
+                    SET last_message_id = NEW.id, last_content = NEW.content, last_timestamp = NEW.timestamp
+                    WHERE (user_id = NEW.sender_id AND partner_id = NEW.recipient_id)
+                       OR (user_id = NEW.recipient_id AND partner_id = NEW.sender_id);
+                    UPDATE conversations
+                    SET unread_count = unread_count + 1
+                    WHERE user_id = NEW.recipient_id AND partner_id = NEW.sender_id AND NEW.sender_id != NEW.recipient_id;
+                END
+            """)
+            c.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_messages_group_last AFTER INSERT ON messages
+                WHEN NEW.group_id IS NOT NULL
+                BEGIN
+                    UPDATE groups SET last_message_id = NEW.id WHERE id = NEW.group_id;
+                END
+            """)
+    
+    def _migrate_attachments(self):
+        # File contents live in the AttachmentStore keyed by SHA-256; rows here link
+        # messages to blobs, so one blob may back many messages
+        with self.transaction() as c:
+            c.execute("""
+                CREATE TABLE IF NOT EXISTS attachments (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    message_id INTEGER REFERENCES messages(id),
+                    sha256 TEXT NOT NULL,
+                    name TEXT,
+                    size INTEGER
+                )
+            """)
+            c.execute("CREATE INDEX IF NOT EXISTS idx_attachments_message ON attachments (message_id)")
+            c.execute("CREATE INDEX IF NOT EXISTS idx_attachments_sha256 ON attachments (sha256)")
+    
+    def _migrate_profile_pic_hash(self):
+        # Content hash of users.profile_pic; thumbnails are cached under it
+        with self.transaction() as c:
+            if not self._column_exists(c, "users", "profile_pic_hash"):
+                c.execute("ALTER TABLE users ADD COLUMN profile_pic_hash TEXT")
+    
+    def _migrate_message_archive(self):
+        # Index of what archive_messages() moved out of messages: one row per archive file
+        # and one per (conversation, archive), so paging only attaches files that matter
+        with self.transaction() as c:
+            c.execute("""
+                CREATE TABLE IF NOT EXISTS message_archives (
+                    period TEXT PRIMARY KEY,
+                    file_name TEXT,
+                    message_count INTEGER
+                )
+            """)
+            c.execute("""
+                CREATE TABLE IF NOT EXISTS archived_conversations (
+                    conversation_key TEXT,
+                    period TEXT,
+                    message_count INTEGER,
+                    newest_timestamp DATETIME,
+                    PRIMARY KEY (conversation_key, period)
+                ) WITHOUT ROWID
+            """)
+            c.execute("CREATE INDEX IF NOT EXISTS idx_messages_timestamp ON messages (timestamp)")
+    
+    def _migrate_tenant_name_index(self):
+        # Serves tenant lookups by exact name and case-insensitive prefix
+        with self.transaction() as c:
+            c.execute("CREATE INDEX IF NOT EXISTS idx_users_role_name ON users (role, name COLLATE NOCASE)")
+    
+    def _record_occupancy(self, c):
+        # Full recount; used after rooms are added and once a day
         c.execute("""
-            CREATE TABLE IF NOT EXISTS rooms (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                room_number TEXT UNIQUE,
-                tenant_id INTEGER,
-                FOREIGN KEY(tenant_id) REFERENCES users(id)
-            )
+            INSERT INTO occupancy_snapshots (occupied, total)
+            SELECT COUNT(tenant_id), COUNT(*) FROM rooms
         """)
-        self.conn.commit()
+    
+    def get_change_sequences(self):
+        c = self._reader()
+        c.execute("SELECT topic, seq FROM change_log")
+        return dict(c.fetchall())
+    
+    # Instrumentation
+    def enable_instrumentation(self, slow_ms=50.0):
+        # Opt-in per-method timing and slow-query logging; returns the Instrumentation
+        # whose snapshot()/export() report what ran
+        from instrumentation import Instrumentation
+        if getattr(self, "instrumentation", None) is None:
+            self.instrumentation = Instrumentation(self, slow_ms=slow_ms).install()
+        return self.instrumentation
+    
+    def disable_instrumentation(self):
+        instrumentation = getattr(self, "instrumentation", None)
+        if instrumentation is not None:
+            instrumentation.uninstall()
+            self.instrumentation = None
     
     # User functions
     def add_user(self, phone, name, role, landlord_id=None, password=None):
-        c = self.conn.cursor()
         if role == "landlord" and not password:
             raise ValueError("Password required for landlord")
-        try:
-            c.execute("INSERT INTO users (phone, name, password, role, landlord_id) VALUES (?, ?, ?, ?, ?)", 
-                      (phone, name, password, role, landlord_id))
-            self.conn.commit()
-            user_id = c.lastrowid
-            is_new = True
-        except sqlite3.IntegrityError:
-            c.execute("SELECT id, password FROM users WHERE phone = ?", (phone,))
-            row = c.fetchone()
-            if row:
-                user_id, stored_pwd = row
-                is_new = False
-                if role == "landlord" and stored_pwd != password:
-                    raise ValueError("Incorrect password for landlord")
-            else:
-                raise
-        if role == "landlord" and is_new:
-            c.execute("SELECT id FROM groups WHERE owner_id = ?", (user_id,))
-            if not c.fetchone():
-                group_name = f"Group of {name}"
-                c.execute("INSERT INTO groups (name, owner_id) VALUES (?, ?)", (group_name, user_id))
-                self.conn.commit()
-                group_id = c.lastrowid
-                self.add_user_to_group(group_id, user_id)
+        with self.transaction() as c:
+            try:
+                c.execute("INSERT INTO users (phone, name, password, role, landlord_id) VALUES (?, ?, ?, ?, ?)", 
+                          (phone, name, password, role, landlord_id))
+                user_id = c.lastrowid
+                is_new = True
+            except sqlite3.IntegrityError:
+                c.execute("SELECT id, password FROM users WHERE phone = ?", (phone,))
+                row = c.fetchone()
+                if row:
+                    user_id, stored_pwd = row
+                    is_new = False
+                    if role == "landlord" and stored_pwd != password:
+                        raise ValueError("Incorrect password for landlord")
+                else:
+                    raise
+            if role == "landlord" and is_new:
+                c.execute("SELECT id FROM groups WHERE owner_id = ?", (user_id,))
+                if not c.fetchone():
+                    group_name = f"Group of {name}"
+                    c.execute("INSERT INTO groups (name, owner_id) VALUES (?, ?)", (group_name, user_id))
+                    group_id = c.lastrowid
+                    self.add_user_to_group(group_id, user_id)
+        self.invalidate_users([user_id])
         return user_id
     
+    def add_users_bulk(self, users):
+        # users: iterable of (phone, name, role, landlord_phone, password), inserted in one
+        # transaction. landlord_phone may refer to a landlord earlier in the same batch.
+        # Existing phones are skipped; new landlords get their group. A new tenant whose
+        # landlord is missing or unknown raises ValueError and nothing from the batch is
+        # kept. Returns the number added
+        users = list(users)
+        with self.transaction() as c:
+            c.execute("SELECT COALESCE(MAX(id), 0) FROM users")
+            last_id = c.fetchone()[0]
+            c.executemany("""
+                INSERT OR IGNORE INTO users (phone, name, role, landlord_id, password)
+                SELECT ?, ?, ?, (SELECT id FROM users WHERE phone = ? AND role = 'landlord'), ?
+            """, users)
+            added = max(c.rowcount, 0)
+            c.execute("""
+                SELECT phone FROM users WHERE id > ? AND role = 'tenant' AND landlord_id IS NULL LIMIT 1
+            """, (last_id,))
+            orphan = c.fetchone()
+            if orphan:
+                landlord_phone = next(user[3] for user in users if user[0] == orphan[0])
+                if landlord_phone:
+                    raise ValueError(f"No landlord with phone {landlord_phone} for tenant {orphan[0]}")
+                raise ValueError(f"No landlord phone for tenant {orphan[0]}")
+            c.execute("""
+                INSERT INTO groups (name, owner_id)
+                SELECT 'Group of ' || u.name, u.id FROM users u
+                WHERE u.id > ? AND u.role = 'landlord'
+                  AND NOT EXISTS (SELECT 1 FROM groups g WHERE g.owner_id = u.id)
+            """, (last_id,))
+            c.execute("""
+                INSERT OR IGNORE INTO group_members (group_id, user_id)
+                SELECT g.id, g.owner_id FROM groups g JOIN users u ON u.id = g.owner_id
+                WHERE u.id > ? AND u.role = 'landlord'
+            """, (last_id,))
+        return added
+    
+    def iter_users(self, batch_size=1000):
+        # Streams (id, phone, name, role, landlord_phone) in id order, batch_size rows per query
+        c = self._reader()
+        last_id = 0
+        while True:
+            c.execute("""
+                SELECT u.id, u.phone, u.name, u.role, l.phone
+                FROM users u LEFT JOIN users l ON l.id = u.landlord_id
+                WHERE u.id > ? ORDER BY u.id LIMIT ?
+            """, (last_id, batch_size))
+            rows = c.fetchall()
+            if not rows:
+                return
+            yield from rows
+            last_id = rows[-1][0]
+    
     def update_user_profile(self, user_id, name=None, profile_pic=None):
-        c = self.conn.cursor()
-        if name:
-            c.execute("UPDATE users SET name = ? WHERE id = ?", (name, user_id))
-        if profile_pic:
-            c.execute("UPDATE users SET profile_pic = ? WHERE id = ?", (profile_pic, user_id))
-        self.conn.commit()
+        # Thumbnails are generated here, once per picture, so views never decode the original
+        profile_pic_hash = self.thumbnail_cache.generate(profile_pic) if profile_pic else None
+        with self.transaction() as c:
+            if name:
+                c.execute("UPDATE users SET name = ? WHERE id = ?", (name, user_id))
+            if profile_pic:
+                c.execute("UPDATE users SET profile_pic = ?, profile_pic_hash = ? WHERE id = ?",
+                          (profile_pic, profile_pic_hash, user_id))
+        self.invalidate_users([user_id])
     
     def get_user(self, user_id):
-        c = self.conn.cursor()
+        # (id, phone, name, profile_pic, role, landlord_id), served from the cache when fresh
+        user = self._users_by_id.get(user_id)
+        if user is not None:
+            return user
+        c = self._reader()
         c.execute("SELECT id, phone, name, profile_pic, role, landlord_id FROM users WHERE id = ?", (user_id,))
+        user = c.fetchone()
+        if user is not None:
+            self._users_by_id.put(user_id, user)
+        return user
+    
+    def get_users(self, user_ids):
+        # Batched get_user: returns {user_id: row}; only ids missing from the cache are queried
+        users = {}
+        missing = []
+        for user_id in dict.fromkeys(user_ids):
+            user = self._users_by_id.get(user_id)
+            if user is None:
+                missing.append(user_id)
+            else:
+                users[user_id] = user
+        c = self._reader()
+        for i in range(0, len(missing), 500):
+            chunk = missing[i:i + 500]
+            c.execute(f"""
+                SELECT id, phone, name, profile_pic, role, landlord_id
+                FROM users WHERE id IN ({",".join("?" * len(chunk))})
+            """, chunk)
+            for user in c.fetchall():
+                self._users_by_id.put(user[0], user)
+                users[user[0]] = user
+        return users
+    
+    def invalidate_users(self, user_ids=None):
+        # Drops cached rows for the given users, or everything
+        if user_ids is None:
+            self._users_by_id.clear()
+            self._users_by_phone.clear()
+            return
+        user_ids = set(user_ids)
+        for user_id in user_ids:
+            self._users_by_id.pop(user_id)
+        self._users_by_phone.pop_where(lambda user: user[0] in user_ids)
+    
+    def get_user_cache_stats(self):
+        return {"by_id": self._users_by_id.stats(), "by_phone": self._users_by_phone.stats()}
+    
+    def get_profile_picture(self, user_id):
+        # Returns (profile_pic, profile_pic_hash)
+        c = self._reader()
+        c.execute("SELECT profile_pic, profile_pic_hash FROM users WHERE id = ?", (user_id,))
         return c.fetchone()
     
     def get_user_by_phone(self, phone):
-        c = self.conn.cursor()
+        user = self._users_by_phone.get(phone)
+        if user is not None:
+            return user
+        c = self._reader()
         c.execute("SELECT id, phone, name, role FROM users WHERE phone = ?", (phone,))
-        return c.fetchone()
+        user = c.fetchone()
+        if user is not None:
+            self._users_by_phone.put(phone, user)
+        return user
     
     # Messaging functions
+    @staticmethod
+    def conversation_key(user_id, target_id):
+        # Same key for both directions of a one-to-one thread
+        return f"{min(user_id, target_id)}:{max(user_id, target_id)}"
+    
     def add_message(self, sender_id, recipient_id, content):
-        c = self.conn.cursor()
-        c.execute("INSERT INTO messages (sender_id, recipient_id, content) VALUES (?, ?, ?)",
-                  (sender_id, recipient_id, content))
-        self.conn.commit()
+        with self.transaction() as c:
+            c.execute("INSERT INTO messages (sender_id, recipient_id, content, conversation_key) VALUES (?, ?, ?, ?)",
+                      (sender_id, recipient_id, content, self.conversation_key(sender_id, recipient_id)))
+            message_id = c.lastrowid
+            c.execute("SELECT timestamp FROM messages WHERE id = ?", (message_id,))
+            return message_id, c.fetchone()[0]
+    
+    def add_messages_bulk(self, messages):
+        # messages: iterable of (sender_id, recipient_id, content), inserted in one transaction
+        with self.transaction() as c:
+            c.executemany(
+                "INSERT INTO messages (sender_id, recipient_id, content, conversation_key) VALUES (?, ?, ?, ?)",
+                ((sender_id, recipient_id, content, self.conversation_key(sender_id, recipient_id))
+                 for sender_id, recipient_id, content in messages))
+            return c.rowcount
+    
+    # Attachments
+    def add_attachment_message(self, sender_id, file_path, recipient_id=None, group_id=None):
+        # Copies the file into the blob store (outside the write lock), then records the
+        # message and its attachment row together. Returns (message_id, timestamp)
+        sha256, size = self.attachment_store.store_file(file_path)
+        name = os.path.basename(file_path)
+        content = f"[Attachment: {name}]"
+        with self.transaction() as c:
+            if group_id is not None:
+                message_id, timestamp = self.add_group_message(sender_id, group_id, content)
+            else:
+                message_id, timestamp = self.add_message(sender_id, recipient_id, content)
+            c.execute("INSERT INTO attachments (message_id, sha256, name, size) VALUES (?, ?, ?, ?)",
+                      (message_id, sha256, name, size))
+            return message_id, timestamp
+    
+    def get_attachments(self, message_ids):
+        # Returns {message_id: (attachment_id, name, size)} for the given messages
+        message_ids = list(message_ids)
+        if not message_ids:
+            return {}
+        c = self._reader()
+        placeholders = ",".join("?" * len(message_ids))
+        c.execute(f"SELECT message_id, id, name, size FROM attachments WHERE message_id IN ({placeholders})",
+                  message_ids)
+        return {row[0]: row[1:] for row in c.fetchall()}
+    
+    def get_attachment(self, attachment_id):
+        # Returns (sha256, name, size)
+        c = self._reader()
+        c.execute("SELECT sha256, name, size FROM attachments WHERE id = ?", (attachment_id,))
+        return c.fetchone()
     
     def get_messages_between(self, user_id, target_id):
-        c = self.conn.cursor()
+        # Full history, including archived messages
+        key = self.conversation_key(user_id, target_id)
+        c = self._reader()
         c.execute("""
             SELECT m.timestamp, m.content, u.name
             FROM messages m
             JOIN users u ON m.sender_id = u.id
-            WHERE (m.sender_id = ? AND m.recipient_id = ?)
-               OR (m.sender_id = ? AND m.recipient_id = ?)
-            ORDER BY m.timestamp
-        """, (user_id, target_id, target_id, user_id))
+            WHERE m.conversation_key = ?
+            ORDER BY m.timestamp, m.id
+        """, (key,))
+        rows = c.fetchall()
+        archived = self._archived_page(c, key, None, None)
+        archived.reverse()
+        return [row[1:] for row in archived] + rows
+    
+    def get_messages_page(self, user_id, target_id, limit=50, before=None):
+        # Newest `limit` messages older than the (timestamp, id) cursor `before`,
+        # returned oldest first as (id, timestamp, content, sender_name)
+        return self._messages_page(self.conversation_key(user_id, target_id), limit, before)
+    
+    def get_messages_since(self, user_id, target_id, after_id):
+        # Messages newer than `after_id`, oldest first
+        return self._messages_since(self.conversation_key(user_id, target_id), after_id)
+    
+    def _messages_page(self, key, limit, before):
+        c = self._reader()
+        rows = self._page_query(c, "main", key, limit, before)
+        if len(rows) < limit:
+            # The hot table is exhausted for this thread; continue in the archives
+            if rows:
+                before = (rows[-1][1], rows[-1][0])
+            rows += self._archived_page(c, key, limit - len(rows), before)
+        rows.reverse()
+        return rows
+    
+    def _page_query(self, c, schema, key, limit, before):
+        # Newest first; limit None means no limit
+        if before is None:
+            c.execute(f"""
+                SELECT m.id, m.timestamp, m.content, u.name
+                FROM {schema}.messages m
+                JOIN main.users u ON m.sender_id = u.id
+                WHERE m.conversation_key = ?
+                ORDER BY m.timestamp DESC, m.id DESC
+                LIMIT ?
+            """, (key, -1 if limit is None else limit))
+        else:
+            c.execute(f"""
+                SELECT m.id, m.timestamp, m.content, u.name
+                FROM {schema}.messages m
+                JOIN main.users u ON m.sender_id = u.id
+                WHERE m.conversation_key = ? AND (m.timestamp, m.id) < (?, ?)
+                ORDER BY m.timestamp DESC, m.id DESC
+                LIMIT ?
+            """, (key, before[0], before[1], -1 if limit is None else limit))
         return c.fetchall()
     
-    def get_conversation_partners(self, user_id):
+    def _messages_since(self, key, after_id):
+        # Seeks on the anchor's timestamp so the cost depends on the number of new rows,
+        # not the thread length
+        c = self._reader()
+        c.execute("""
+            SELECT m.id, m.timestamp, m.content, u.name
+            FROM messages m
+            JOIN users u ON m.sender_id = u.id
+            WHERE m.conversation_key = ?
+              AND m.timestamp >= COALESCE((SELECT timestamp FROM messages WHERE id = ?), '')
+              AND m.id > ?
+            ORDER BY m.timestamp, m.id
+        """, (key, after_id, after_id))
+        return c.fetchall()
+    
+    def iter_messages(self, batch_size=1000):
+        # Streams every message, archived ones first, as (id, timestamp, sender_phone,
+        # sender_name, recipient_phone, group_id, content). Each batch is a separate keyset
+        # query, so memory stays constant and no statement is held open between batches
+        c = self._reader()
+        c.execute("SELECT period FROM message_archives ORDER BY period")
+        periods = [row[0] for row in c.fetchall()]
+        for period in periods:
+            # One archive attached at a time, so any number of years stays under
+            # SQLite's limit on attached databases
+            attached = [row[1] for row in c.execute("PRAGMA database_list")]
+            alias = self._attach_archive(c.connection, period)
+            if alias is None:
+                continue
+            try:
+                yield from self._iter_schema_messages(c, alias, batch_size)
+            finally:
+                if alias not in attached:
+                    c.execute("DETACH DATABASE " + alias)
+        yield from self._iter_schema_messages(c, "main", batch_size)
+    
+    def _iter_schema_messages(self, c, schema, batch_size):
+        last_id = 0
+        while True:
+            c.execute(f"""
+                SELECT m.id, m.timestamp, s.phone, s.name, r.phone, m.group_id, m.content
+                FROM {schema}.messages m
+                JOIN main.users s ON s.id = m.sender_id
+                LEFT JOIN main.users r ON r.id = m.recipient_id
+                WHERE m.id > ? ORDER BY m.id LIMIT ?
+            """, (last_id, batch_size))
+            rows = c.fetchall()
+            if not rows:
+                return
+            yield from rows
+            last_id = rows[-1][0]
+    
+    # Archival
+    def archive_path(self, period):
+        return os.path.join(os.path.dirname(os.path.abspath(self.db_name)), "archive", f"messages-{period}.db")
+    
+    def _attach_archive(self, conn, period, create=False):
+        # Attaches the archive for `period` to conn (once per connection) and returns its
+        # schema name, or None if there is no such archive
+        alias = f"archive_{period}"
+        attached = [row[1] for row in conn.execute("PRAGMA database_list")]
+        if alias in attached:
+            return alias
+        path = self.archive_path(period)
+        if not create and not os.path.exists(path):
+            return None
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            conn.execute("ATTACH DATABASE ? AS " + alias, (path,))
+        except sqlite3.OperationalError:
+            # Too many attached databases: drop the other archives and retry
+            for name in attached:
+                if name.startswith("archive_"):
+                    conn.execute("DETACH DATABASE " + name)
+            conn.execute("ATTACH DATABASE ? AS " + alias, (path,))
+        if create:
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {alias}.messages (
+                    id INTEGER PRIMARY KEY,
+                    sender_id INTEGER,
+                    recipient_id INTEGER,
+                    content TEXT,
+                    timestamp DATETIME,
+                    conversation_key TEXT,
+                    group_id INTEGER
+                )
+            """)
+            conn.execute(f"""
+                CREATE INDEX IF NOT EXISTS {alias}.idx_messages_conversation_time
+                ON messages (conversation_key, timestamp, id)
+            """)
+        return alias
+    
+    def _archived_page(self, c, key, limit, before):
+        # Newest-first rows of one conversation from the archives older than `before`.
+        # Only archives listed for this conversation in archived_conversations are attached
+        c.execute("SELECT period FROM archived_conversations WHERE conversation_key = ? ORDER BY period DESC",
+                  (key,))
+        periods = [row[0] for row in c.fetchall()]
+        if before is not None:
+            periods = [period for period in periods if period <= before[0][:4]]
+        rows = []
+        for period in periods:
+            try:
+                alias = self._attach_archive(c.connection, period)
+            except sqlite3.OperationalError:
+                # ATTACH is not allowed inside an open transaction
+                break
+            if alias is None:
+                continue
+            rows += self._page_query(c, alias, key, None if limit is None else limit - len(rows), before)
+            if limit is not None and len(rows) >= limit:
+                break
+            if rows:
+                before = (rows[-1][1], rows[-1][0])
+        return rows
+    
+    def archive_messages(self, older_than_days=365, batch_size=ARCHIVE_BATCH_SIZE):
+        # Moves messages older than the cutoff into one archive file per calendar year,
+        # batch_size rows per transaction, then returns freed pages to the filesystem.
+        # Rows are copied before they are deleted, so an interrupted run leaves duplicates
+        # at worst, never gaps; re-running resumes. Returns the number of messages moved
         c = self.conn.cursor()
+        c.execute("SELECT datetime('now', ?)", (f"-{int(older_than_days)} days",))
+        cutoff = c.fetchone()[0]
+        c.execute("SELECT MIN(timestamp) FROM messages")
+        oldest = c.fetchone()[0]
+        moved = 0
+        if oldest is None or oldest >= cutoff:
+            return moved
+        for year in range(int(oldest[:4]), int(cutoff[:4]) + 1):
+            period = str(year)
+            upper = min(cutoff, f"{year + 1}-01-01")
+            with self._write_lock:
+                c = self.conn.cursor()
+                c.execute("SELECT 1 FROM messages WHERE timestamp >= ? AND timestamp < ? LIMIT 1",
+                          (f"{year}-01-01", upper))
+                if c.fetchone() is None:
+                    # No archive file for a year without messages
+                    continue
+                # ATTACH must happen outside a transaction
+                alias = self._attach_archive(self.conn, period, create=True)
+            while True:
+                with self._write_lock:
+                    with self.transaction() as c:
+                        c.execute("CREATE TEMP TABLE IF NOT EXISTS archive_batch (id INTEGER PRIMARY KEY)")
+                        c.execute("DELETE FROM temp.archive_batch")
+                        c.execute("""
+                            INSERT INTO temp.archive_batch
+                            SELECT id FROM messages WHERE timestamp >= ? AND timestamp < ?
+                            ORDER BY timestamp LIMIT ?
+                        """, (f"{year}-01-01", upper, batch_size))
+                        count = c.rowcount
+                        if not count:
+                            break
+                        c.execute(f"""
+                            INSERT OR IGNORE INTO {alias}.messages
+                                (id, sender_id, recipient_id, content, timestamp, conversation_key, group_id)
+                            SELECT id, sender_id, recipient_id, content, timestamp, conversation_key, group_id
+                            FROM main.messages WHERE id IN (SELECT id FROM temp.archive_batch)
+                        """)
+                        c.execute("""
+                            INSERT INTO archived_conversations (conversation_key, period, message_count, newest_timestamp)
+                            SELECT conversation_key, ?, COUNT(*), MAX(timestamp)
+                            FROM main.messages WHERE id IN (SELECT id FROM temp.archive_batch)
+                            GROUP BY conversation_key
+                            ON CONFLICT (conversation_key, period) DO UPDATE SET
+                                message_count = message_count + excluded.message_count,
+                                newest_timestamp = MAX(newest_timestamp, excluded.newest_timestamp)
+                        """, (period,))
+                        c.execute("""
+                            INSERT INTO message_archives (period, file_name, message_count) VALUES (?, ?, ?)
+                            ON CONFLICT (period) DO UPDATE SET message_count = message_count + excluded.message_count
+                        """, (period, os.path.basename(self.archive_path(period)), count))
+                        c.execute("DELETE FROM main.messages WHERE id IN (SELECT id FROM temp.archive_batch)")
+                        moved += count
+            with self._write_lock:
+                self.conn.execute("DETACH DATABASE " + alias)
+        if moved:
+            self.vacuum()
+        return moved
+    
+    def vacuum(self):
+        # Incremental vacuum releases free pages without rewriting the file. A database
+        # created without auto_vacuum is converted once, which needs a full VACUUM
+        with self._write_lock:
+            c = self.conn.cursor()
+            c.execute("PRAGMA auto_vacuum")
+            if c.fetchone()[0] != 2:
+                c.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                c.execute("VACUUM")
+            else:
+                # Each step of the pragma frees one page; executescript runs it to completion
+                self.conn.executescript("PRAGMA incremental_vacuum;")
+            if self.pooled:
+                # In WAL mode the file only shrinks once the freed pages are checkpointed
+                c.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    
+    def get_conversation_partners(self, user_id):
+        c = self._reader()
         c.execute("""
-            SELECT DISTINCT
-                CASE WHEN sender_id = ? THEN recipient_id ELSE sender_id END AS partner_id
-            FROM messages
-            WHERE sender_id = ? OR recipient_id = ?
-        """, (user_id, user_id, user_id))
-        rows = c.fetchall()
-        partners = []
-        for row in rows:
-            partner_id = row[0]
-            c.execute("SELECT id, phone, name FROM users WHERE id = ?", (partner_id,))
-            partner = c.fetchone()
-            if partner:
-                partners.append(partner)
-        return partners
+            SELECT u.id, u.phone, u.name
+            FROM conversations c
+            JOIN users u ON c.partner_id = u.id
+            WHERE c.user_id = ?
+            ORDER BY c.last_message_id DESC
+        """, (user_id,))
+        return c.fetchall()
+    
+    def get_inbox(self, user_id, after_message_id=0):
+        # Returns (partner_id, name, phone, last_content, last_timestamp, unread_count, profile_pic_hash,
+        # last_message_id), most recent first. With after_message_id only conversations that
+        # changed since that message are returned, read straight off idx_conversations_recent
+        c = self._reader()
+        c.execute("""
+            SELECT c.partner_id, u.name, u.phone, c.last_content, c.last_timestamp, c.unread_count, u.profile_pic_hash,
+                   c.last_message_id
+            FROM conversations c
+            JOIN users u ON c.partner_id = u.id
+            WHERE c.user_id = ? AND c.last_message_id > ?
+            ORDER BY c.last_message_id DESC
+        """, (user_id, after_message_id))
+        return c.fetchall()
+    
+    def mark_conversation_read(self, user_id, partner_id):
+        with self.transaction() as c:
+            c.execute("""
+                INSERT OR REPLACE INTO conversation_reads (user_id, partner_id, last_read_id)
+                SELECT user_id, partner_id, last_message_id
+                FROM conversations
+                WHERE user_id = ? AND partner_id = ?
+            """, (user_id, partner_id))
+            c.execute("UPDATE conversations SET unread_count = 0 WHERE user_id = ? AND partner_id = ?",
+                      (user_id, partner_id))
+    
+    UNREAD_COUNT_SQL = """
+        UPDATE conversations
+        SET unread_count = (
+            SELECT COUNT(*)
+            FROM messages m
+            LEFT JOIN conversation_reads r
+                   ON r.user_id = conversations.user_id AND r.partner_id = conversations.partner_id
+            LEFT JOIN messages rm ON rm.id = r.last_read_id
+            WHERE m.conversation_key = MIN(conversations.user_id, conversations.partner_id) || ':'
+                                       || MAX(conversations.user_id, conversations.partner_id)
+              AND m.timestamp >= COALESCE(rm.timestamp, '')
+              AND m.id > COALESCE(r.last_read_id, 0)
+              AND m.sender_id = conversations.partner_id
+              AND m.sender_id != conversations.user_id
+        )
+    """
+    
+    def recount_unread(self, user_id=None):
+        # Rebuilds unread_count from the conversation_reads markers, for one user or for
+        # everyone in rowid batches; repairs counts if the inbox trigger was ever missing
+        if user_id is not None:
+            with self.transaction() as c:
+                c.execute(self.UNREAD_COUNT_SQL + " WHERE user_id = ?", (user_id,))
+            return
+        self._backfill_in_batches("conversations", self.UNREAD_COUNT_SQL + " WHERE rowid >= :lo AND rowid < :hi")
+    
+    @staticmethod
+    def fts_query(text):
+        # Turns free text into an FTS5 query of quoted prefix terms, so user input
+        # can never be a syntax error
+        return " ".join('"' + term.replace('"', '""') + '"*' for term in re.findall(r"\w+", text))
+    
+    def search_messages(self, user_id, query, limit=20, cursor=None):
+        # Ranked full-text search limited to the user's own conversations. Returns
+        # (message_id, partner_id, partner_name, timestamp, snippet, rank); pass
+        # (rank, message_id) of the last row as `cursor` to get the next page
+        match = self.fts_query(query)
+        if not match:
+            return []
+        c = self._reader()
+        sql = """
+            SELECT m.id, u.id, u.name, m.timestamp,
+                   snippet(messages_fts, 0, '[', ']', '...', 12), messages_fts.rank
+            FROM messages_fts
+            JOIN messages m ON m.id = messages_fts.rowid
+            JOIN users u ON u.id = CASE WHEN m.sender_id = :user THEN m.recipient_id ELSE m.sender_id END
+            WHERE messages_fts MATCH :match
+              AND (m.sender_id = :user OR m.recipient_id = :user)
+        """
+        params = {"user": user_id, "match": match, "limit": limit}
+        if cursor is not None:
+            sql += " AND (messages_fts.rank, m.id) > (:rank, :after_id)"
+            params["rank"], params["after_id"] = cursor
+        sql += " ORDER BY messages_fts.rank, m.id LIMIT :limit"
+        c.execute(sql, params)
+        return c.fetchall()
     
     # Status functions
     def add_status(self, user_id, status):
-        c = self.conn.cursor()
-        c.execute("INSERT INTO statuses (user_id, status) VALUES (?, ?)", (user_id, status))
-        self.conn.commit()
+        with self.transaction() as c:
+            c.execute("INSERT INTO statuses (user_id, status) VALUES (?, ?)", (user_id, status))
+        self.invalidate_status_feed(user_id)
+    
+    def get_status_feed(self, owner_id, limit=STATUS_PAGE_SIZE, before=None):
+        # Returns (id, timestamp, status, sender_name), newest first, older than the
+        # (timestamp, id) cursor `before`. The first page is served from the cache.
+        if before is None and limit <= self.STATUS_PAGE_SIZE:
+            with self._status_feed_lock:
+                page = self._status_feed_cache.get(owner_id)
+            if page is None:
+                page = self._query_status_feed(owner_id, self.STATUS_PAGE_SIZE, None)
+                with self._status_feed_lock:
+                    self._status_feed_cache[owner_id] = page
+            return page[:limit]
+        return self._query_status_feed(owner_id, limit, before)
+    
+    def _query_status_feed(self, owner_id, limit, before):
+        c = self._reader()
+        if before is None:
+            c.execute("""
+                SELECT s.id, s.timestamp, s.status, u.name
+                FROM statuses s
+                JOIN users u ON s.user_id = u.id
+                WHERE s.user_id = ?
+                ORDER BY s.timestamp DESC, s.id DESC
+                LIMIT ?
+            """, (owner_id, limit))
+        else:
+            c.execute("""
+                SELECT s.id, s.timestamp, s.status, u.name
+                FROM statuses s
+                JOIN users u ON s.user_id = u.id
+                WHERE s.user_id = ? AND (s.timestamp, s.id) < (?, ?)
+                ORDER BY s.timestamp DESC, s.id DESC
+                LIMIT ?
+            """, (owner_id, before[0], before[1], limit))
+        return c.fetchall()
+    
+    def invalidate_status_feed(self, owner_id=None):
+        # Drops one landlord's cached page, or all of them
+        with self._status_feed_lock:
+            if owner_id is None:
+                self._status_feed_cache.clear()
+            else:
+                self._status_feed_cache.pop(owner_id, None)
+    
+    def iter_statuses(self, owner_id=None, batch_size=1000):
+        # Streams (id, timestamp, landlord_phone, landlord_name, status) in id order
+        c = self._reader()
+        last_id = 0
+        while True:
+            c.execute("""
+                SELECT s.id, s.timestamp, u.phone, u.name, s.status
+                FROM statuses s JOIN users u ON u.id = s.user_id
+                WHERE s.id > ? AND (? IS NULL OR s.user_id = ?)
+                ORDER BY s.id LIMIT ?
+            """, (last_id, owner_id, owner_id, batch_size))
+            rows = c.fetchall()
+            if not rows:
+                return
+            yield from rows
+            last_id = rows[-1][0]
     
     def get_statuses_for_group(self, owner_id):
-        c = self.conn.cursor()
+        c = self._reader()
         c.execute("""
             SELECT s.timestamp, s.status, u.name
             FROM statuses s
@@ -177,26 +1219,112 @@ class DatabaseManager:
         """, (owner_id,))
         return c.fetchall()
     
+    def get_statuses_since(self, owner_id, after_id=0):
+        # Returns (id, timestamp, status, sender_name) posted after `after_id`, newest first
+        c = self._reader()
+        c.execute("""
+            SELECT s.id, s.timestamp, s.status, u.name
+            FROM statuses s
+            JOIN users u ON s.user_id = u.id
+            WHERE s.user_id = ? AND s.id > ?
+            ORDER BY s.timestamp DESC, s.id DESC
+        """, (owner_id, after_id))
+        return c.fetchall()
+    
     # Group functions
     def add_group(self, name, owner_id):
-        c = self.conn.cursor()
-        c.execute("INSERT INTO groups (name, owner_id) VALUES (?, ?)", (name, owner_id))
-        self.conn.commit()
-        return c.lastrowid
+        with self.transaction() as c:
+            c.execute("INSERT INTO groups (name, owner_id) VALUES (?, ?)", (name, owner_id))
+            return c.lastrowid
     
     def add_user_to_group(self, group_id, user_id):
-        c = self.conn.cursor()
-        c.execute("INSERT OR IGNORE INTO group_members (group_id, user_id) VALUES (?, ?)", (group_id, user_id))
-        self.conn.commit()
+        with self.transaction() as c:
+            c.execute("INSERT OR IGNORE INTO group_members (group_id, user_id) VALUES (?, ?)", (group_id, user_id))
+    
+    def add_users_to_group(self, group_id, user_ids):
+        # Adds many members in one transaction; existing members are skipped. Returns the number added.
+        with self.transaction() as c:
+            c.executemany("INSERT OR IGNORE INTO group_members (group_id, user_id) VALUES (?, ?)",
+                          ((group_id, user_id) for user_id in user_ids))
+            return max(c.rowcount, 0)
+    
+    def remove_users_from_group(self, group_id, user_ids):
+        with self.transaction() as c:
+            c.executemany("DELETE FROM group_members WHERE group_id = ? AND user_id = ?",
+                          ((group_id, user_id) for user_id in user_ids))
+            return max(c.rowcount, 0)
+    
+    def get_tenant_ids(self, landlord_id):
+        c = self._reader()
+        c.execute("SELECT id FROM users WHERE landlord_id = ? AND role = 'tenant'", (landlord_id,))
+        return [row[0] for row in c.fetchall()]
+    
+    # Group messages
+    @staticmethod
+    def group_conversation_key(group_id):
+        return f"g:{group_id}"
+    
+    def add_group_message(self, sender_id, group_id, content):
+        # One row per broadcast, whatever the group size; returns (id, timestamp)
+        with self.transaction() as c:
+            c.execute("INSERT INTO messages (sender_id, group_id, content, conversation_key) VALUES (?, ?, ?, ?)",
+                      (sender_id, group_id, content, self.group_conversation_key(group_id)))
+            message_id = c.lastrowid
+            c.execute("SELECT timestamp FROM messages WHERE id = ?", (message_id,))
+            return message_id, c.fetchone()[0]
+    
+    def get_group_messages_page(self, group_id, limit=50, before=None):
+        return self._messages_page(self.group_conversation_key(group_id), limit, before)
+    
+    def get_group_messages_since(self, group_id, after_id):
+        return self._messages_since(self.group_conversation_key(group_id), after_id)
+    
+    def get_group_inbox(self, user_id, after_message_id=None):
+        # Returns (group_id, name, last_content, last_timestamp, unread_count, last_message_id)
+        # for every group the user belongs to, most recent first. Unread counts only scan
+        # messages after the member's read cursor. With after_message_id only groups with a
+        # newer message are returned.
+        c = self._reader()
+        c.execute("""
+            SELECT g.id, g.name, m.content, m.timestamp,
+                   (SELECT COUNT(*)
+                    FROM messages u
+                    WHERE u.conversation_key = 'g:' || g.id
+                      AND u.timestamp >= COALESCE(rm.timestamp, '')
+                      AND u.id > COALESCE(r.last_read_id, 0)
+                      AND u.sender_id != gm.user_id),
+                   g.last_message_id
+            FROM group_members gm
+            JOIN groups g ON g.id = gm.group_id
+            LEFT JOIN messages m ON m.id = g.last_message_id
+            LEFT JOIN group_reads r ON r.group_id = gm.group_id AND r.user_id = gm.user_id
+            LEFT JOIN messages rm ON rm.id = r.last_read_id
+            WHERE gm.user_id = ? AND (? IS NULL OR g.last_message_id > ?)
+            ORDER BY g.last_message_id IS NULL, g.last_message_id DESC
+        """, (user_id, after_message_id, after_message_id))
+        return c.fetchall()
+    
+    def mark_group_read(self, group_id, user_id):
+        with self.transaction() as c:
+            c.execute("""
+                INSERT OR REPLACE INTO group_reads (group_id, user_id, last_read_id)
+                SELECT id, ?, last_message_id FROM groups WHERE id = ?
+            """, (user_id, group_id))
     
     def get_group_by_owner(self, owner_id):
-        c = self.conn.cursor()
+        c = self._reader()
         c.execute("SELECT id FROM groups WHERE owner_id = ?", (owner_id,))
         row = c.fetchone()
         return row[0] if row else None
     
+    def get_group_owner(self, group_id):
+        c = self._reader()
+        c.execute("SELECT owner_id FROM groups WHERE id = ?", (group_id,))
+        row = c.fetchone()
+        return row[0] if row else None
+    
     def get_group_members(self, group_id):
-        c = self.conn.cursor()
+        c = self._reader()
         c.execute("""
             SELECT u.id, u.name
             FROM group_members gm
@@ -205,34 +1333,360 @@ class DatabaseManager:
         """, (group_id,))
         return c.fetchall()
     
+    def get_group_members_page(self, group_id, limit=50, after_user_id=None):
+        # Returns (id, name) of up to `limit` members ordered by user id, after `after_user_id`
+        c = self._reader()
+        c.execute("""
+            SELECT u.id, u.name
+            FROM group_members gm
+            JOIN users u ON gm.user_id = u.id
+            WHERE gm.group_id = ? AND gm.user_id > ?
+            ORDER BY gm.user_id
+            LIMIT ?
+        """, (group_id, after_user_id if after_user_id is not None else -1, limit))
+        return c.fetchall()
+    
+    def get_group_member_count(self, group_id):
+        c = self._reader()
+        c.execute("SELECT member_count FROM groups WHERE id = ?", (group_id,))
+        row = c.fetchone()
+        return row[0] if row else 0
+    
     def get_groups(self):
-        c = self.conn.cursor()
+        c = self._reader()
         c.execute("SELECT id, name FROM groups")
         return c.fetchall()
     
+    def get_groups_with_counts(self):
+        c = self._reader()
+        c.execute("SELECT id, name, member_count FROM groups")
+        return c.fetchall()
+    
     # Apartment management functions
     def initialize_rooms(self, num_rooms):
-        c = self.conn.cursor()
-        c.execute("SELECT COUNT(*) FROM rooms")
-        count = c.fetchone()[0]
-        if count < num_rooms:
-            for i in range(count + 1, num_rooms + 1):
-                room_number = str(i)
-                c.execute("INSERT OR IGNORE INTO rooms (room_number) VALUES (?)", (room_number,))
-            self.conn.commit()
+        # Ensures rooms "1".."num_rooms" exist, filling any gaps
+        self.provision_rooms(1, num_rooms)
+    
+    def provision_rooms(self, start, end, prefix="", width=0):
+        # Inserts rooms prefix + n (zero-padded to `width`) for n in start..end in one
+        # statement; existing rooms are left untouched. Returns the number added.
+        with self.transaction() as c:
+            c.execute("""
+                INSERT OR IGNORE INTO rooms (room_number)
+                WITH RECURSIVE seq(n) AS (
+                    SELECT ? WHERE ? <= ?
+                    UNION ALL
+                    SELECT n + 1 FROM seq WHERE n < ?
+                )
+                SELECT ? || printf('%0*d', ?, n) FROM seq
+            """, (start, start, end, end, prefix, width))
+            added = max(c.rowcount, 0)
+            if added:
+                self._record_occupancy(c)
+            return added
+    
+    def provision_room_ranges(self, ranges):
+        # ranges: iterable of (prefix, start, end) or (prefix, start, end, width), e.g. one
+        # entry per floor or block, all provisioned in a single transaction
+        added = 0
+        with self.transaction():
+            for room_range in ranges:
+                prefix, start, end = room_range[:3]
+                width = room_range[3] if len(room_range) > 3 else 0
+                added += self.provision_rooms(start, end, prefix, width)
+        return added
+    
+    def add_rooms_bulk(self, room_numbers):
+        # Inserts the given room numbers in one transaction, skipping existing ones.
+        # Returns the number added
+        with self.transaction() as c:
+            c.executemany("INSERT OR IGNORE INTO rooms (room_number) VALUES (?)",
+                          ((str(room_number),) for room_number in room_numbers))
+            added = max(c.rowcount, 0)
+            if added:
+                self._record_occupancy(c)
+            return added
+    
+    def assign_rooms_by_phone(self, assignments):
+        # assignments: iterable of (room_number, tenant_phone), applied in one transaction.
+        # Returns the number of rooms updated; unknown rooms or phones are skipped
+        with self.transaction() as c:
+            c.executemany("""
+                UPDATE rooms SET tenant_id = (SELECT id FROM users WHERE phone = ? AND role = 'tenant')
+                WHERE room_number = ? AND EXISTS (SELECT 1 FROM users WHERE phone = ? AND role = 'tenant')
+            """, ((phone, str(room_number), phone) for room_number, phone in assignments))
+            return max(c.rowcount, 0)
     
     def assign_tenant_to_room_by_name(self, room_number, tenant_name):
-        c = self.conn.cursor()
-        c.execute("SELECT id FROM users WHERE name = ? AND role = 'tenant'", (tenant_name,))
-        row = c.fetchone()
-        if row:
-            tenant_id = row[0]
-            c.execute("UPDATE rooms SET tenant_id = ? WHERE room_number = ?", (tenant_id, room_number))
-            self.conn.commit()
-            return True
-        return False
+        # Returns False if no tenant has this name or the room does not exist; raises
+        # ValueError if the name is shared, since picking one would be a guess
+        with self.transaction() as c:
+            # The NOCASE comparison lets idx_users_role_name seek; the second keeps the match exact
+            c.execute("SELECT id FROM users WHERE role = 'tenant' AND name = ? COLLATE NOCASE AND name = ? LIMIT 2",
+                      (tenant_name, tenant_name))
+            rows = c.fetchall()
+            if len(rows) > 1:
+                raise ValueError(f"Several tenants are named {tenant_name}")
+            if not rows:
+                return False
+            c.execute("UPDATE rooms SET tenant_id = ? WHERE room_number = ?", (rows[0][0], room_number))
+            return c.rowcount > 0
+    
+    def assign_rooms_bulk(self, assignments):
+        # assignments: iterable of (room_number, tenant_id), applied in one transaction.
+        # Returns the number of rooms updated
+        with self.transaction() as c:
+            c.executemany("UPDATE rooms SET tenant_id = ? WHERE room_number = ?",
+                          ((tenant_id, str(room_number)) for room_number, tenant_id in assignments))
+            return max(c.rowcount, 0)
+    
+    def search_tenants(self, prefix, limit=10):
+        # Tenants whose name starts with prefix (case-insensitive), as (id, name, phone);
+        # a range scan on idx_users_role_name
+        prefix = prefix.strip()
+        if not prefix:
+            return []
+        c = self._reader()
+        c.execute("""
+            SELECT id, name, phone FROM users
+            WHERE role = 'tenant' AND name >= ? COLLATE NOCASE AND name < ? COLLATE NOCASE
+            ORDER BY name COLLATE NOCASE, id
+            LIMIT ?
+        """, (prefix, prefix + "\U0010ffff", limit))
+        return c.fetchall()
     
     def get_rooms(self):
-        c = self.conn.cursor()
+        c = self._reader()
         c.execute("SELECT room_number, tenant_id FROM rooms ORDER BY CAST(room_number AS INTEGER)")
         return c.fetchall()
+    
+    def get_rooms_with_tenants(self, limit=None, after=None):
+        # Returns (room_number, tenant_id, tenant_name) in room order, optionally a chunk
+        # of `limit` rows after the room number `after`
+        c = self._reader()
+        query = """
+            SELECT r.room_number, r.tenant_id, u.name
+            FROM rooms r
+            LEFT JOIN users u ON r.tenant_id = u.id
+        """
+        params = []
+        if after is not None:
+            # The redundant single-column bound lets SQLite seek the expression index
+            query += """
+                WHERE CAST(r.room_number AS INTEGER) >= CAST(? AS INTEGER)
+                  AND (CAST(r.room_number AS INTEGER), r.room_number) > (CAST(? AS INTEGER), ?)
+            """
+            params += [after, after, after]
+        query += " ORDER BY CAST(r.room_number AS INTEGER), r.room_number"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        c.execute(query, params)
+        return c.fetchall()
+    
+    # Occupancy history
+    def record_daily_occupancy(self):
+        # Takes today's recount if there is none yet, then rolls snapshots up into
+        # occupancy_daily from the last rolled-up day onwards
+        with self.transaction() as c:
+            c.execute("""
+                SELECT 1 FROM occupancy_snapshots
+                WHERE taken_at >= date('now')
+                LIMIT 1
+            """)
+            if c.fetchone() is None:
+                self._record_occupancy(c)
+            c.execute("SELECT COALESCE(MAX(day), '') FROM occupancy_daily")
+            last_day = c.fetchone()[0]
+            c.execute("""
+                INSERT OR REPLACE INTO occupancy_daily
+                    (day, occupied_min, occupied_max, occupied_avg, occupied_close, total)
+                SELECT d.day, d.occupied_min, d.occupied_max, d.occupied_avg, s.occupied, s.total
+                FROM (
+                    SELECT date(taken_at) AS day, MIN(occupied) AS occupied_min, MAX(occupied) AS occupied_max,
+                           AVG(occupied) AS occupied_avg, MAX(id) AS last_id
+                    FROM occupancy_snapshots
+                    WHERE taken_at >= ?
+                    GROUP BY date(taken_at)
+                ) d
+                JOIN occupancy_snapshots s ON s.id = d.last_id
+            """, (last_day,))
+    
+    def get_occupancy_series(self, days=None):
+        # Daily closing occupancy as (unix_day_start, occupied, total) rows, oldest first.
+        # With `days`, the last row before the window is included so the value at the
+        # start of the window is known.
+        c = self._reader()
+        query = """
+            SELECT CAST(strftime('%s', day) AS INTEGER), occupied_close, total
+            FROM occupancy_daily
+        """
+        params = ()
+        if days is not None:
+            query += """
+                WHERE day >= COALESCE((SELECT MAX(day) FROM occupancy_daily WHERE day <= date('now', ?)),
+                                      date('now', ?))
+            """
+            params = (f"-{int(days)} days",) * 2
+        query += " ORDER BY day"
+        c.execute(query, params)
+        return c.fetchall()
+
+
+class ReaderHolder:
+    # Thread-local owner of a pooled reader connection; see DatabaseManager._reader
+    def __init__(self, conn):
+        self.conn = conn
+
+class TTLCache:
+    # Thread-safe LRU bounded by size, whose entries also expire `ttl` seconds after
+    # they were stored. Counts hits and misses
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+    
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+    
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+    
+    def pop_where(self, predicate):
+        with self._lock:
+            for key in [key for key, (_, value) in self._entries.items() if predicate(value)]:
+                del self._entries[key]
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+class ChangeTracker:
+    # Detects commits made through any other connection, including other processes.
+    # PRAGMA data_version only moves when someone else committed, so an idle poll costs
+    # one pragma; change_log then tells which topics actually changed.
+    def __init__(self, db_manager):
+        self.conn = db_manager._connect()
+        self.data_version = self._data_version()
+        self.sequences = self._sequences()
+    
+    def _data_version(self):
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+    
+    def _sequences(self):
+        return dict(self.conn.execute("SELECT topic, seq FROM change_log").fetchall())
+    
+    def poll(self):
+        # Returns the set of topics changed since the previous poll
+        data_version = self._data_version()
+        if data_version == self.data_version:
+            return set()
+        self.data_version = data_version
+        sequences = self._sequences()
+        changed = {topic for topic, seq in sequences.items() if self.sequences.get(topic) != seq}
+        self.sequences = sequences
+        return changed
+    
+    def close(self):
+        self.conn.close()
+
+
+class GroupCommitWriter:
+    # Background writer that coalesces statements submitted within `window` seconds
+    # of each other into a single transaction (one fsync per batch instead of per row).
+    # Requires a pooled DatabaseManager, whose write connection may be used from any thread.
+    def __init__(self, db_manager, window=0.005, max_batch=1000):
+        if not db_manager.pooled:
+            raise ValueError("GroupCommitWriter requires a pooled DatabaseManager")
+        self.db_manager = db_manager
+        self.window = window
+        self.max_batch = max_batch
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="group-commit-writer", daemon=True)
+        self.thread.start()
+    
+    def submit(self, sql, params=()):
+        # Returns a Future resolving to the statement's lastrowid once its batch commits
+        future = Future()
+        self.queue.put((sql, params, future))
+        return future
+    
+    def add_message(self, sender_id, recipient_id, content):
+        return self.submit(
+            "INSERT INTO messages (sender_id, recipient_id, content, conversation_key) VALUES (?, ?, ?, ?)",
+            (sender_id, recipient_id, content, DatabaseManager.conversation_key(sender_id, recipient_id)))
+    
+    def flush(self):
+        # Blocks until everything submitted so far is committed
+        self.submit("SELECT 1").result()
+    
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+    
+    def _run(self):
+        running = True
+        while running:
+            item = self.queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                batch.append(item)
+            self._commit(batch)
+    
+    def _commit(self, batch):
+        results = []
+        try:
+            with self.db_manager.transaction() as c:
+                for sql, params, future in batch:
+                    # A failing statement only fails its own future; the rest of the batch still commits
+                    try:
+                        c.execute(sql, params)
+                        results.append((future, c.lastrowid, None))
+                    except sqlite3.Error as e:
+                        results.append((future, None, e))
+        except sqlite3.Error as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        for future, rowid, error in results:
+            if error is None:
+                future.set_result(rowid)
+            else:
+                future.set_exception(error)
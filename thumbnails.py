@@ -0,0 +1,88 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ThumbnailCache:
+    # Fixed-size PNG thumbnails on disk, keyed by the source's content hash and the
+    # thumbnail size, plus a bounded LRU of decoded pixmaps. Qt is imported only when an
+    # image is actually decoded, so headless users of the model do not load it
+    SIZES = (32, 100)
+    MEMORY_ITEMS = 256
+    
+    def __init__(self, root):
+        self.root = root
+        self._pixmaps = OrderedDict()
+        self._file_hashes = {}
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def for_database(cls, db_name):
+        # Thumbnails live in a "thumbnails" directory next to the database file
+        return cls(os.path.join(os.path.dirname(os.path.abspath(db_name)), "thumbnails"))
+    
+    def thumbnail_path(self, sha256, size):
+        return os.path.join(self.root, sha256[:2], f"{sha256}_{size}.png")
+    
+    def generate(self, source_path, sizes=None):
+        # Decodes the source once and writes any missing thumbnails. Returns the content
+        # hash, or None if the file is not a readable image
+        from PyQt6.QtCore import Qt
+        from PyQt6.QtGui import QImage
+        sha256 = file_sha256(source_path)
+        missing = [size for size in (sizes or self.SIZES) if not os.path.exists(self.thumbnail_path(sha256, size))]
+        if not missing:
+            return sha256
+        image = QImage(source_path)
+        if image.isNull():
+            return None
+        os.makedirs(os.path.join(self.root, sha256[:2]), exist_ok=True)
+        for size in missing:
+            thumbnail = image.scaled(size, size, Qt.AspectRatioMode.KeepAspectRatio,
+                                     Qt.TransformationMode.SmoothTransformation)
+            thumbnail.save(self.thumbnail_path(sha256, size), "PNG")
+        return sha256
+    
+    def pixmap(self, sha256, size, source_path=None):
+        # QPixmap for a thumbnail, or None. If the thumbnail file is missing it is
+        # regenerated from source_path when that is given
+        from PyQt6.QtGui import QPixmap
+        key = (sha256, size)
+        with self._lock:
+            pixmap = self._pixmaps.get(key)
+            if pixmap is not None:
+                self._pixmaps.move_to_end(key)
+                return pixmap
+        path = self.thumbnail_path(sha256, size)
+        if not os.path.exists(path):
+            if not source_path or not os.path.exists(source_path) or self.generate(source_path, (size,)) != sha256:
+                return None
+        pixmap = QPixmap(path)
+        if pixmap.isNull():
+            return None
+        with self._lock:
+            self._pixmaps[key] = pixmap
+            while len(self._pixmaps) > self.MEMORY_ITEMS:
+                self._pixmaps.popitem(last=False)
+        return pixmap
+    
+    def pixmap_for_file(self, path, size):
+        # Thumbnail of a file that is not tracked in the database (e.g. the logo); the
+        # hash is remembered per (path, mtime, length) so the file is hashed once per run
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        file_key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+        sha256 = self._file_hashes.get(file_key)
+        if sha256 is None:
+            sha256 = file_sha256(path)
+            self._file_hashes[file_key] = sha256
+        return self.pixmap(sha256, size, source_path=path)
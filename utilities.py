@@ -1,5 +1,10 @@
 import sys
 import os
+import time
+
+# Reference points for startup timing; main.py imports this module first
+_process_start = time.perf_counter()
+_last_mark = _process_start
 
 def resource_path(relative_path):
     try:
@@ -7,3 +12,12 @@ def resource_path(relative_path):
     except Exception:
         base_path = os.path.abspath(".")
     return os.path.join(base_path, relative_path)
+
+def startup_mark(label):
+    # Prints time since startup and since the previous mark when APP_STARTUP_TIMING is set
+    global _last_mark
+    if os.environ.get("APP_STARTUP_TIMING"):
+        now = time.perf_counter()
+        print(f"[startup] {label}: {(now - _process_start) * 1000:.1f} ms "
+              f"(+{(now - _last_mark) * 1000:.1f} ms)", file=sys.stderr, flush=True)
+        _last_mark = now
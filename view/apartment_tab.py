@@ -1,11 +1,88 @@
 # apartment_tab.py
-from PyQt6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLineEdit, QPushButton, QTableWidget, QTableWidgetItem, QMessageBox, QHeaderView
-from PyQt6.QtCore import Qt
+from PyQt6.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QLineEdit, QPushButton, QTableView, QMessageBox, QHeaderView, QCompleter
+)
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, QStringListModel, QTimer
+
+class RoomTableModel(QAbstractTableModel):
+    # Rooms are fetched in chunks as the view scrolls instead of all at once
+    CHUNK_SIZE = 200
+    HEADERS = ["Room Number", "Tenant Name"]
+    
+    def __init__(self, db_manager, parent=None):
+        super().__init__(parent)
+        self.db_manager = db_manager
+        self.rooms = []
+        self.exhausted = False
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rooms)
+    
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+    
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        room_number, tenant_id, tenant_name = self.rooms[index.row()]
+        if index.column() == 0:
+            return room_number
+        if tenant_id:
+            return tenant_name if tenant_name else "Unknown"
+        return "Vacant"
+    
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return None
+    
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.exhausted
+    
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        after = self.rooms[-1][0] if self.rooms else None
+        chunk = self.db_manager.get_rooms_with_tenants(limit=self.CHUNK_SIZE, after=after)
+        self.exhausted = len(chunk) < self.CHUNK_SIZE
+        if chunk:
+            self.beginInsertRows(QModelIndex(), len(self.rooms), len(self.rooms) + len(chunk) - 1)
+            self.rooms.extend(chunk)
+            self.endInsertRows()
+    
+    def refresh_loaded(self):
+        # Re-reads only the rows already fetched, plus one to see whether more follow, in one
+        # query, and updates them in place
+        if not self.rooms:
+            self.reload()
+            return
+        rows = self.db_manager.get_rooms_with_tenants(limit=len(self.rooms) + 1)
+        rows, more = rows[:len(self.rooms)], rows[len(self.rooms):]
+        if [row[0] for row in rows] != [row[0] for row in self.rooms]:
+            # Rooms were added or removed in the loaded range
+            self.reload()
+            return
+        self.rooms = rows
+        self.dataChanged.emit(self.index(0, 1), self.index(len(self.rooms) - 1, 1))
+        if more and self.exhausted:
+            # Rooms were added after the last one loaded
+            self.exhausted = False
+            self.fetchMore()
+    
+    def reload(self):
+        self.beginResetModel()
+        self.rooms = []
+        self.exhausted = False
+        self.endResetModel()
 
 class ApartmentManagementTab(QWidget):
+    TENANT_SUGGESTIONS = 10
+    
     def __init__(self, db_manager, parent=None):
         super().__init__(parent)
         self.db_manager = db_manager
+        # Completion text -> tenant id for the current suggestions
+        self.tenant_suggestions = {}
         self.initUI()
     
     def initUI(self):
@@ -27,9 +104,9 @@ class ApartmentManagementTab(QWidget):
         layout.addLayout(init_layout)
         
         # Table to show room assignments
-        self.rooms_table = QTableWidget()
-        self.rooms_table.setColumnCount(2)
-        self.rooms_table.setHorizontalHeaderLabels(["Room Number", "Tenant Name"])
+        self.rooms_model = RoomTableModel(self.db_manager, self)
+        self.rooms_table = QTableView()
+        self.rooms_table.setModel(self.rooms_model)
         self.rooms_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
         self.rooms_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
         layout.addWidget(self.rooms_table)
@@ -41,6 +118,16 @@ class ApartmentManagementTab(QWidget):
         assign_layout.addWidget(self.room_number_edit)
         self.tenant_name_edit = QLineEdit()
         self.tenant_name_edit.setPlaceholderText("Tenant Name")
+        # Suggestions come from an indexed prefix search once typing pauses
+        self.tenant_completer_model = QStringListModel(self)
+        self.tenant_completer = QCompleter(self.tenant_completer_model, self)
+        self.tenant_completer.setCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+        self.tenant_name_edit.setCompleter(self.tenant_completer)
+        self.tenant_search_timer = QTimer(self)
+        self.tenant_search_timer.setSingleShot(True)
+        self.tenant_search_timer.setInterval(200)
+        self.tenant_search_timer.timeout.connect(self.update_tenant_suggestions)
+        self.tenant_name_edit.textEdited.connect(self.tenant_search_timer.start)
         assign_layout.addWidget(self.tenant_name_edit)
         self.assign_button = QPushButton("Assign Tenant")
         self.assign_button.clicked.connect(self.assign_tenant)
@@ -59,22 +146,35 @@ class ApartmentManagementTab(QWidget):
             QMessageBox.warning(self, "Input Error", "Please enter a valid number.")
     
     def load_rooms(self):
-        rooms = self.db_manager.get_rooms()  # returns list of (room_number, tenant_id)
-        self.rooms_table.setRowCount(len(rooms))
-        for row, (room_number, tenant_id) in enumerate(rooms):
-            self.rooms_table.setItem(row, 0, QTableWidgetItem(room_number))
-            if tenant_id:
-                tenant = self.db_manager.get_user(tenant_id)
-                tenant_name = tenant[2] if tenant else "Unknown"
-                self.rooms_table.setItem(row, 1, QTableWidgetItem(tenant_name))
-            else:
-                self.rooms_table.setItem(row, 1, QTableWidgetItem("Vacant"))
+        # The view pulls the first chunk through fetchMore once the model is reset
+        self.rooms_model.reload()
+    
+    def on_rooms_changed(self):
+        self.rooms_model.refresh_loaded()
+    
+    def update_tenant_suggestions(self):
+        # Suggestions read "Name (phone)" so tenants sharing a name can be told apart
+        tenants = self.db_manager.search_tenants(self.tenant_name_edit.text(), limit=self.TENANT_SUGGESTIONS)
+        self.tenant_suggestions = {f"{name} ({phone})": tenant_id for tenant_id, name, phone in tenants}
+        self.tenant_completer_model.setStringList(list(self.tenant_suggestions))
+        if self.tenant_suggestions and self.tenant_name_edit.hasFocus():
+            self.tenant_completer.complete()
     
     def assign_tenant(self):
         room_number = self.room_number_edit.text().strip()
         tenant_name = self.tenant_name_edit.text().strip()
         if room_number and tenant_name:
-            if self.db_manager.assign_tenant_to_room_by_name(room_number, tenant_name):
+            tenant_id = self.tenant_suggestions.get(tenant_name)
+            try:
+                if tenant_id is not None:
+                    assigned = self.db_manager.assign_rooms_bulk([(room_number, tenant_id)]) > 0
+                else:
+                    assigned = self.db_manager.assign_tenant_to_room_by_name(room_number, tenant_name)
+            except ValueError:
+                QMessageBox.warning(self, "Ambiguous Name",
+                                    f"More than one tenant is named {tenant_name}. Pick one from the suggestions.")
+                return
+            if assigned:
                 self.load_rooms()
                 QMessageBox.information(self, "Assigned", f"Assigned {tenant_name} to room {room_number}.")
             else:
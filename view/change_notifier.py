@@ -0,0 +1,29 @@
+# change_notifier.py
+from PyQt6.QtCore import QObject, QTimer
+from model import ChangeTracker
+
+class ChangeNotifier(QObject):
+    # Polls the database for changes made by other connections and calls only the
+    # handlers subscribed to the topics that changed
+    POLL_INTERVAL_MS = 1000
+    
+    def __init__(self, db_manager, parent=None):
+        super().__init__(parent)
+        self.tracker = ChangeTracker(db_manager)
+        self.handlers = {}
+        self.timer = QTimer(self)
+        self.timer.setInterval(self.POLL_INTERVAL_MS)
+        self.timer.timeout.connect(self.poll)
+        self.timer.start()
+    
+    def subscribe(self, topic, handler):
+        self.handlers.setdefault(topic, []).append(handler)
+    
+    def poll(self):
+        for topic in self.tracker.poll():
+            for handler in self.handlers.get(topic, []):
+                handler()
+    
+    def stop(self):
+        self.timer.stop()
+        self.tracker.close()
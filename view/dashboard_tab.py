@@ -1,46 +1,151 @@
 # dashboard_tab.py
-import numpy as np
-import matplotlib.pyplot as plt
-from scipy import stats
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-
+# numpy, scipy and matplotlib are imported when the dashboard is first shown, not at
+# module import, so they do not slow down the login dialog or the main window
+import datetime
+import logging
 from PyQt6.QtWidgets import QWidget, QVBoxLayout
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+logger = logging.getLogger(__name__)
+
+class DashboardDataSignals(QObject):
+    finished = pyqtSignal(object, object)
+    failed = pyqtSignal(object, object)
+
+class DashboardDataWorker(QRunnable):
+    # Rolls up occupancy and runs the NumPy/SciPy pipeline off the GUI thread
+    def __init__(self, db_manager, key, days):
+        super().__init__()
+        self.db_manager = db_manager
+        self.key = key
+        self.days = days
+        self.signals = DashboardDataSignals()
+    
+    def run(self):
+        # An exception escaping QRunnable.run aborts the application, so failures (e.g.
+        # "database is locked" while another process writes) are reported as a signal
+        try:
+            import analytics
+            self.db_manager.record_daily_occupancy()
+            result = analytics.occupancy_trend(self.db_manager, days=self.days)
+        except Exception as e:
+            self.deliver("failed", e)
+        else:
+            self.deliver("finished", result)
+    
+    def deliver(self, signal_name, value):
+        try:
+            getattr(self.signals, signal_name).emit(self.key, value)
+        except RuntimeError:
+            # The dashboard was destroyed while the data was being prepared
+            pass
 
 class DashboardTab(QWidget):
+    HISTORY_DAYS = 90
+    
     def __init__(self, db_manager, parent=None):
         super().__init__(parent)
         self.db_manager = db_manager
+        self.canvas = None
+        # Key of the data currently drawn and of the data being prepared, if any
+        self.rendered_key = None
+        self.pending_key = None
+        self.worker = None
+        self.background = None
         self.initUI()
     
     def initUI(self):
-        layout = QVBoxLayout(self)
+        self.chart_layout = QVBoxLayout(self)
+    
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.canvas is None:
+            self.init_chart()
+    
+    def init_chart(self):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
         # Create a Matplotlib figure and embed it in a canvas
-        self.figure, self.ax = plt.subplots(figsize=(4, 3))
+        self.figure = Figure(figsize=(4, 3))
+        self.ax = self.figure.add_subplot()
         self.canvas = FigureCanvas(self.figure)
-        layout.addWidget(self.canvas)
+        self.chart_layout.addWidget(self.canvas)
+        # Static parts are drawn once; the lines and summary text are animated artists
+        # updated in place and blitted over the cached background
+        self.ax.set_xlim(-self.HISTORY_DAYS, 0)
+        self.ax.set_ylim(0, 100)
+        self.ax.set_title("Apartment Occupancy")
+        self.ax.set_xlabel("Days from today")
+        self.ax.set_ylabel("Occupancy (%)")
+        self.history_line, = self.ax.plot([], [], 'o-', label="Occupancy (%)", animated=True)
+        self.trend_line, = self.ax.plot([], [], 'r--', label="Trend", animated=True)
+        self.summary_text = self.ax.text(0.02, 0.95, "", transform=self.ax.transAxes,
+                                         verticalalignment="top", animated=True)
+        self.ax.legend(loc="lower left")
+        self.canvas.mpl_connect("draw_event", self.on_draw)
+        self.canvas.draw()
         # Update the dashboard when shown (or you can call update_dashboard() periodically)
         self.update_dashboard()
     
+    def current_key(self):
+        # Redraw only when rooms changed or a new day started
+        return self.db_manager.get_change_sequences().get("rooms"), datetime.date.today()
+    
     def update_dashboard(self):
-        # Get room data from the model
-        rooms = self.db_manager.get_rooms()  # returns list of tuples (room_number, tenant_id)
-        total = len(rooms)
-        occupied = sum(1 for _, tenant in rooms if tenant)
-        occupancy_pct = (occupied / total * 100) if total > 0 else 0
-
-        # For demonstration, simulate a 20-day history trending to current occupancy
-        days = np.arange(1, 21)
-        # Dummy history: linearly trends from 70% to the current occupancy with random noise
-        history = np.linspace(70, occupancy_pct, num=20) + np.random.randint(-3, 4, size=20)
-        # Compute a linear regression trend using SciPy
-        slope, intercept, r_value, _, _ = stats.linregress(days, history)
-        trend = slope * days + intercept
-
-        self.ax.clear()
-        self.ax.plot(days, history, 'o-', label="Occupancy (%)")
-        self.ax.plot(days, trend, 'r--', label=f"Trend (r={r_value:.2f})")
-        self.ax.set_title("Apartment Occupancy (Current: {:.1f}%)".format(occupancy_pct))
-        self.ax.set_xlabel("Day")
-        self.ax.set_ylabel("Occupancy (%)")
-        self.ax.legend()
-        self.canvas.draw()
+        if self.canvas is None:
+            return
+        key = self.current_key()
+        if key == self.rendered_key or self.pending_key is not None:
+            return
+        self.pending_key = key
+        if not self.db_manager.pooled:
+            # A single-connection manager can only be used from this thread
+            import analytics
+            try:
+                self.db_manager.record_daily_occupancy()
+                result = analytics.occupancy_trend(self.db_manager, days=self.HISTORY_DAYS)
+            except Exception as e:
+                self.on_data_failed(key, e)
+                return
+            self.on_data_ready(key, result)
+            return
+        self.worker = DashboardDataWorker(self.db_manager, key, self.HISTORY_DAYS)
+        self.worker.signals.finished.connect(self.on_data_ready)
+        self.worker.signals.failed.connect(self.on_data_failed)
+        QThreadPool.globalInstance().start(self.worker)
+    
+    def on_data_ready(self, key, result):
+        days, history, trend, r_value = result
+        occupancy_pct = history[-1] if len(history) else 0
+        self.history_line.set_data(days, history)
+        self.trend_line.set_data(days, trend)
+        self.summary_text.set_text(f"Current: {occupancy_pct:.1f}%  Trend r={r_value:.2f}")
+        self.rendered_key = key
+        self.pending_key = None
+        self.worker = None
+        self.blit()
+        # Rooms may have changed again while the data was being prepared
+        self.update_dashboard()
+    
+    def on_data_failed(self, key, error):
+        # Keep the last rendered chart; the next rooms change notification retries
+        logger.error("dashboard update failed", exc_info=error)
+        self.pending_key = None
+        self.worker = None
+    
+    def on_draw(self, event):
+        # Full redraws (first show, resize) refresh the cached background
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self.draw_animated()
+    
+    def draw_animated(self):
+        for artist in (self.history_line, self.trend_line, self.summary_text):
+            self.ax.draw_artist(artist)
+    
+    def blit(self):
+        if self.background is None:
+            self.canvas.draw()
+            return
+        self.canvas.restore_region(self.background)
+        self.draw_animated()
+        self.canvas.blit(self.figure.bbox)
@@ -3,6 +3,8 @@ from PyQt6.QtWidgets import QWidget, QVBoxLayout, QLineEdit, QPushButton, QListW
 from PyQt6.QtCore import Qt
 
 class GroupsTab(QWidget):
+    MEMBERS_SHOWN = 50
+    
     def __init__(self, db_manager, current_user_id, parent=None):
         super().__init__(parent)
         self.db_manager = db_manager
@@ -22,6 +24,9 @@ class GroupsTab(QWidget):
         self.view_members_button = QPushButton("View Group Members")
         self.view_members_button.clicked.connect(self.view_group_members)
         layout.addWidget(self.view_members_button)
+        self.sync_tenants_button = QPushButton("Add All My Tenants to Group")
+        self.sync_tenants_button.clicked.connect(self.sync_tenants)
+        layout.addWidget(self.sync_tenants_button)
         self.load_groups()
     
     def create_group(self):
@@ -39,17 +44,41 @@ class GroupsTab(QWidget):
     
     def load_groups(self):
         self.groups_list.clear()
-        groups = self.db_manager.get_groups()
-        for group_id, name in groups:
-            self.groups_list.addItem(f"{group_id}: {name}")
+        groups = self.db_manager.get_groups_with_counts()
+        for group_id, name, member_count in groups:
+            self.groups_list.addItem(f"{group_id}: {name} ({member_count} members)")
     
-    def view_group_members(self):
+    def selected_group_id(self):
         current_item = self.groups_list.currentItem()
         if current_item:
             group_info = current_item.text().split(":")
-            group_id = int(group_info[0])
-            members = self.db_manager.get_group_members(group_id)
+            return int(group_info[0])
+        QMessageBox.warning(self, "No Group Selected", "Please select a group.")
+        return None
+    
+    def view_group_members(self):
+        group_id = self.selected_group_id()
+        if group_id is not None:
+            # Only the first page of names is fetched; the total comes from the stored count
+            members = self.db_manager.get_group_members_page(group_id, self.MEMBERS_SHOWN)
+            member_count = self.db_manager.get_group_member_count(group_id)
             member_names = ", ".join([name for (_, name) in members])
-            QMessageBox.information(self, "Group Members", f"Members: {member_names}")
-        else:
-            QMessageBox.warning(self, "No Group Selected", "Please select a group.")
+            if member_count > len(members):
+                member_names += f" and {member_count - len(members)} more"
+            QMessageBox.information(self, "Group Members", f"Members ({member_count}): {member_names}")
+    
+    def sync_tenants(self):
+        user = self.db_manager.get_user(self.current_user_id)
+        if user and user[4] != "landlord":
+            QMessageBox.warning(self, "Not Allowed", "Only landlords can add tenants to groups.")
+            return
+        group_id = self.selected_group_id()
+        if group_id is not None:
+            # The list shows every group; tenants may only be added to the landlord's own
+            if self.db_manager.get_group_owner(group_id) != self.current_user_id:
+                QMessageBox.warning(self, "Not Allowed", "You can only add tenants to groups you own.")
+                return
+            tenant_ids = self.db_manager.get_tenant_ids(self.current_user_id)
+            added = self.db_manager.add_users_to_group(group_id, tenant_ids)
+            self.load_groups()
+            QMessageBox.information(self, "Group Updated", f"Added {added} tenants to the group.")
@@ -1,13 +1,13 @@
 # view/login_view.py
-import os
 from PyQt6.QtWidgets import QDialog, QVBoxLayout, QLabel, QLineEdit, QPushButton, QComboBox, QMessageBox
-from PyQt6.QtGui import QPixmap, QIcon
+from PyQt6.QtGui import QIcon
 from PyQt6.QtCore import Qt
 from utilities import resource_path  # new import
 
 class LoginView(QDialog):
-    def __init__(self, parent=None):
+    def __init__(self, db_manager, parent=None):
         super().__init__(parent)
+        self.db_manager = db_manager
         self.setWindowTitle("Login / Register")
         self.setWindowIcon(QIcon(resource_path("university_logo.ico")))  # use resource_path here
         self.setFixedSize(350, 300)
@@ -16,9 +16,9 @@ class LoginView(QDialog):
         # Logo and Developer name
         self.logo_label = QLabel()
         logo_path = resource_path("university_logo.png")  # use resource_path here
-        if os.path.exists(logo_path):
-            pixmap = QPixmap(logo_path)
-            self.logo_label.setPixmap(pixmap.scaled(100, 100, Qt.AspectRatioMode.KeepAspectRatio))
+        pixmap = self.db_manager.thumbnail_cache.pixmap_for_file(logo_path, 100)
+        if pixmap is not None:
+            self.logo_label.setPixmap(pixmap)
         else:
             self.logo_label.setText("University Logo")
         self.logo_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
@@ -80,20 +80,14 @@ class LoginView(QDialog):
 
         landlord_id = None
         if landlord_phone:
-            from controller import AppController  # avoid circular dependency
-            app_controller = AppController()
-            db_manager = app_controller.db_manager
-            landlord = db_manager.get_user_by_phone(landlord_phone)
+            landlord = self.db_manager.get_user_by_phone(landlord_phone)
             if not landlord:
                 QMessageBox.warning(self, "Error", "Landlord with this phone number not found.")
                 return
             landlord_id = landlord[0]
 
-        from controller import AppController  # avoid circular dependency
-        app_controller = AppController()
-        db_manager = app_controller.db_manager
         try:
-            user_id = db_manager.add_user(phone, name, role, landlord_id, password)
+            user_id = self.db_manager.add_user(phone, name, role, landlord_id, password)
         except ValueError as ve:
             QMessageBox.warning(self, "Login Error", str(ve))
             return
@@ -1,10 +1,10 @@
 # view/main_view.py
-import os
 from PyQt6.QtWidgets import QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QTabWidget
-from PyQt6.QtGui import QPixmap, QIcon
+from PyQt6.QtGui import QIcon
 from PyQt6.QtCore import Qt
 from view.tabs import MessagingTab, StatusTab, GroupsTab, ProfileTab, ApartmentManagementTab, DashboardTab
-from utilities import resource_path  # new import
+from view.change_notifier import ChangeNotifier
+from utilities import resource_path, startup_mark
 
 class MainView(QMainWindow):
     def __init__(self, user_id, user_name, user_role, db_manager, parent=None):
@@ -27,8 +27,8 @@ class MainView(QMainWindow):
         header_layout = QHBoxLayout()
         logo_label = QLabel()
         logo_path = resource_path("university_logo.png")  # use resource_path here
-        if os.path.exists(logo_path):
-            pix = QPixmap(logo_path).scaled(80, 80, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
+        pix = self.db_manager.thumbnail_cache.pixmap_for_file(logo_path, 80)
+        if pix is not None:
             logo_label.setPixmap(pix)
         else:
             logo_label.setText("University Logo")
@@ -38,15 +38,22 @@ class MainView(QMainWindow):
         header_layout.addWidget(dev_label)
         main_layout.addLayout(header_layout)
         
-        # Tabs
+        # Live refresh: tabs are told when another connection changes their data
+        self.change_notifier = ChangeNotifier(self.db_manager, self)
+        
+        # Tabs are built the first time they are activated
         self.tabs = QTabWidget()
-        self.tabs.addTab(MessagingTab(self.db_manager, self.user_id), "Messages")
-        self.tabs.addTab(StatusTab(self.db_manager, self.user_id), "Status")
-        self.tabs.addTab(ProfileTab(self.db_manager, self.user_id), "Profile")
+        self.tab_factories = {}
+        self.tab_widgets = {}
+        self.add_lazy_tab("Messages", lambda: MessagingTab(self.db_manager, self.user_id))
+        self.add_lazy_tab("Status", lambda: StatusTab(self.db_manager, self.user_id))
+        self.add_lazy_tab("Profile", lambda: ProfileTab(self.db_manager, self.user_id))
         if self.user_role == "landlord":
-            self.tabs.addTab(GroupsTab(self.db_manager, self.user_id), "Groups")
-            self.tabs.addTab(DashboardTab(self.db_manager), "Dashboard")
-            self.tabs.addTab(ApartmentManagementTab(self.db_manager), "Apartments")
+            self.add_lazy_tab("Groups", lambda: GroupsTab(self.db_manager, self.user_id))
+            self.add_lazy_tab("Dashboard", lambda: DashboardTab(self.db_manager))
+            self.add_lazy_tab("Apartments", lambda: ApartmentManagementTab(self.db_manager))
+        self.tabs.currentChanged.connect(self.build_tab)
+        self.build_tab(self.tabs.currentIndex())
         main_layout.addWidget(self.tabs)
         
         # Footer
@@ -56,3 +63,35 @@ class MainView(QMainWindow):
         footer = QLabel(footer_text)
         footer.setAlignment(Qt.AlignmentFlag.AlignCenter)
         main_layout.addWidget(footer)
+    
+    def add_lazy_tab(self, title, factory):
+        placeholder = QWidget()
+        layout = QVBoxLayout(placeholder)
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.tab_factories[title] = factory
+        self.tabs.addTab(placeholder, title)
+    
+    def build_tab(self, index):
+        title = self.tabs.tabText(index)
+        factory = self.tab_factories.pop(title, None)
+        if factory is None:
+            return
+        widget = factory()
+        self.tabs.widget(index).layout().addWidget(widget)
+        self.tab_widgets[title] = widget
+        self.subscribe_to_changes(widget)
+        startup_mark(f"{title} tab built")
+    
+    def subscribe_to_changes(self, widget):
+        if isinstance(widget, MessagingTab):
+            self.change_notifier.subscribe("messages", widget.on_messages_changed)
+        elif isinstance(widget, StatusTab):
+            self.change_notifier.subscribe("statuses", widget.on_statuses_changed)
+        elif isinstance(widget, ApartmentManagementTab):
+            self.change_notifier.subscribe("rooms", widget.on_rooms_changed)
+        elif isinstance(widget, DashboardTab):
+            self.change_notifier.subscribe("rooms", widget.update_dashboard)
+    
+    def closeEvent(self, event):
+        self.change_notifier.stop()
+        super().closeEvent(event)
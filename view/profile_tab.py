@@ -1,8 +1,5 @@
 # profile_tab.py
-import os
 from PyQt6.QtWidgets import QWidget, QVBoxLayout, QLabel, QLineEdit, QPushButton, QMessageBox
-from PyQt6.QtGui import QPixmap
-from PyQt6.QtCore import Qt
 
 class ProfileTab(QWidget):
     def __init__(self, db_manager, current_user_id, parent=None):
@@ -55,17 +52,30 @@ class ProfileTab(QWidget):
             self.name_edit.setText(name)
             self.phone_edit.setText(phone)
             self.role_display.setText(role.capitalize())
-            if profile_pic and os.path.exists(profile_pic):
-                pix = QPixmap(profile_pic).scaled(100, 100, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
+            pix = self.profile_thumbnail()
+            if pix is not None:
                 self.pic_display.setPixmap(pix)
             else:
                 self.pic_display.setText("No Picture")
     
+    def profile_thumbnail(self):
+        # Cached 100px thumbnail; pictures saved before hashes were stored are hashed here
+        profile_pic, profile_pic_hash = self.db_manager.get_profile_picture(self.current_user_id)
+        cache = self.db_manager.thumbnail_cache
+        if profile_pic_hash:
+            return cache.pixmap(profile_pic_hash, 100, source_path=profile_pic)
+        if profile_pic:
+            return cache.pixmap_for_file(profile_pic, 100)
+        return None
+    
     def change_profile_picture(self):
         from PyQt6.QtWidgets import QFileDialog
         file_path, _ = QFileDialog.getOpenFileName(self, "Select Profile Picture")
         if file_path:
-            pix = QPixmap(file_path).scaled(100, 100, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
+            pix = self.db_manager.thumbnail_cache.pixmap_for_file(file_path, 100)
+            if pix is None:
+                QMessageBox.warning(self, "Error", "The selected file is not a readable image.")
+                return
             self.pic_display.setPixmap(pix)
             self.new_profile_pic = file_path
     
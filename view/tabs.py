@@ -1,23 +1,31 @@
 # view/tabs.py
-import os
 from PyQt6.QtWidgets import (
-    QWidget, QVBoxLayout, QHBoxLayout, QListWidget, QTextEdit, QLineEdit,
+    QWidget, QVBoxLayout, QHBoxLayout, QListWidget, QTextBrowser, QLineEdit,
     QPushButton, QFileDialog, QMessageBox, QListWidgetItem, QTableWidget,
     QTableWidgetItem, QHeaderView
 )
-from PyQt6.QtCore import Qt
-from PyQt6.QtGui import QPixmap
-import numpy as np
-import matplotlib.pyplot as plt
-from scipy import stats
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from PyQt6.QtCore import Qt, QTimer, QSize
+from PyQt6.QtGui import QPixmap, QIcon, QTextCursor, QTextCharFormat, QPalette
 
 class MessagingTab(QWidget):
+    PAGE_SIZE = 50
+    SEARCH_PAGE_SIZE = 50
+    # Conversation list items for groups carry the group id under this role
+    GROUP_ROLE = Qt.ItemDataRole.UserRole + 2
+    AVATAR_SIZE = 32
+    
     def __init__(self, db_manager, current_user_id, parent=None):
         super().__init__(parent)
         self.db_manager = db_manager
         self.current_user_id = current_user_id
         self.target_user_id = None
+        # Set instead of target_user_id while a group broadcast thread is open
+        self.target_group_id = None
+        # (timestamp, id) of the oldest message shown; older pages load on scroll to top
+        self.oldest_cursor = None
+        self.newest_id = None
+        self.has_older = False
+        self.loading_older = False
         self.initUI()
     
     def initUI(self):
@@ -25,18 +33,36 @@ class MessagingTab(QWidget):
         # Left: Conversation list
         left_layout = QVBoxLayout()
         self.conversation_list = QListWidget()
+        self.conversation_list.setIconSize(QSize(self.AVATAR_SIZE, self.AVATAR_SIZE))
         self.conversation_list.itemClicked.connect(self.select_conversation)
         left_layout.addWidget(self.conversation_list)
+        # Message search results replace the conversation list while search mode is on
+        self.search_results = QListWidget()
+        self.search_results.itemClicked.connect(self.open_search_result)
+        self.search_results.setVisible(False)
+        left_layout.addWidget(self.search_results)
         self.search_input = QLineEdit()
         self.search_input.setPlaceholderText("Search by phone/name...")
         self.search_input.textChanged.connect(self.filter_conversations)
         left_layout.addWidget(self.search_input)
+        self.search_mode_button = QPushButton("Search Messages")
+        self.search_mode_button.setCheckable(True)
+        self.search_mode_button.toggled.connect(self.set_search_mode)
+        left_layout.addWidget(self.search_mode_button)
+        # Full-text search runs once typing pauses rather than on every keystroke
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(250)
+        self.search_timer.timeout.connect(self.run_message_search)
         main_layout.addLayout(left_layout, 1)
         
         # Right: Chat display & input
         right_layout = QVBoxLayout()
-        self.chat_display = QTextEdit()
-        self.chat_display.setReadOnly(True)
+        # Attachments are shown as links that save the file from the attachment store
+        self.chat_display = QTextBrowser()
+        self.chat_display.setOpenLinks(False)
+        self.chat_display.anchorClicked.connect(self.save_attachment)
+        self.chat_display.verticalScrollBar().valueChanged.connect(self.on_chat_scrolled)
         right_layout.addWidget(self.chat_display)
         input_layout = QHBoxLayout()
         self.message_input = QLineEdit()
@@ -54,21 +80,130 @@ class MessagingTab(QWidget):
     
     def load_conversations(self):
         self.conversation_list.clear()
-        partners = self.db_manager.get_conversation_partners(self.current_user_id)
-        for partner in partners:
-            # partner: (id, phone, name)
-            item_text = f"{partner[2]} ({partner[1]})"
-            item = QListWidgetItem(item_text)
-            item.setData(Qt.ItemDataRole.UserRole, partner[0])
-            self.conversation_list.addItem(item)
+        # Items by (partner_id, group_id), and the newest last_message_id any of them shows
+        self.conversation_items = {}
+        self.inbox_cursor = 0
+        # Direct conversations and the user's groups, merged by most recent activity
+        for entry in reversed(self.conversation_entries()):
+            self.conversation_list.addItem(self.set_conversation_item(QListWidgetItem(), entry))
+    
+    def conversation_entries(self, after_message_id=None):
+        # Returns (last_message_id, last_timestamp, title, last_content, unread_count, partner_id,
+        # group_id, pic_hash) oldest activity first; groups without messages sort first
+        entries = []
+        for partner_id, name, phone, last_content, last_timestamp, unread_count, pic_hash, last_message_id \
+                in self.db_manager.get_inbox(self.current_user_id, after_message_id or 0):
+            entries.append((last_message_id, last_timestamp or "", f"{name} ({phone})", last_content,
+                            unread_count, partner_id, None, pic_hash))
+        for group_id, name, last_content, last_timestamp, unread_count, last_message_id \
+                in self.db_manager.get_group_inbox(self.current_user_id, after_message_id):
+            entries.append((last_message_id or 0, last_timestamp or "", f"[Group] {name}", last_content or "",
+                            unread_count, None, group_id, None))
+        entries.sort(key=lambda entry: entry[0])
+        return entries
+    
+    def set_conversation_item(self, item, entry):
+        last_message_id, last_timestamp, title, last_content, unread_count, partner_id, group_id, pic_hash = entry
+        item_text = title
+        if unread_count:
+            item_text += f" [{unread_count}]"
+        item.setText(f"{item_text}\n{last_timestamp} - {last_content}")
+        item.setData(Qt.ItemDataRole.UserRole, partner_id)
+        item.setData(Qt.ItemDataRole.UserRole + 1, f"{title}\n{last_timestamp} - {last_content}")
+        item.setData(self.GROUP_ROLE, group_id)
+        # Avatars come from the thumbnail cache, never from the original photo
+        avatar = self.db_manager.thumbnail_cache.pixmap(pic_hash, self.AVATAR_SIZE) if pic_hash else None
+        if avatar is not None:
+            item.setIcon(QIcon(avatar))
+        self.conversation_items[(partner_id, group_id)] = item
+        self.inbox_cursor = max(self.inbox_cursor, last_message_id)
+        return item
+    
+    def refresh_conversations(self):
+        # Only conversations with a message newer than any shown are fetched; their items
+        # are updated in place and moved to the top, the rest of the list is left alone
+        current_item = self.conversation_list.currentItem()
+        for entry in self.conversation_entries(self.inbox_cursor):
+            item = self.conversation_items.get((entry[5], entry[6]))
+            if item is None:
+                item = QListWidgetItem()
+            else:
+                self.conversation_list.takeItem(self.conversation_list.row(item))
+            self.conversation_list.insertItem(0, self.set_conversation_item(item, entry))
+        if current_item is not None:
+            self.conversation_list.setCurrentItem(current_item)
+    
+    def has_target(self):
+        return self.target_user_id is not None or self.target_group_id is not None
+    
+    def fetch_page(self, before=None):
+        if self.target_group_id is not None:
+            return self.db_manager.get_group_messages_page(self.target_group_id, self.PAGE_SIZE, before=before)
+        return self.db_manager.get_messages_page(self.current_user_id, self.target_user_id,
+                                                 self.PAGE_SIZE, before=before)
+    
+    def fetch_since(self, after_id):
+        if self.target_group_id is not None:
+            return self.db_manager.get_group_messages_since(self.target_group_id, after_id)
+        return self.db_manager.get_messages_since(self.current_user_id, self.target_user_id, after_id)
+    
+    def post(self, content):
+        if self.target_group_id is not None:
+            self.db_manager.add_group_message(self.current_user_id, self.target_group_id, content)
+            self.db_manager.mark_group_read(self.target_group_id, self.current_user_id)
+        else:
+            self.db_manager.add_message(self.current_user_id, self.target_user_id, content)
+    
+    def on_messages_changed(self):
+        # Another connection wrote messages: refresh the inbox and append to the open thread.
+        # The open thread is being read, so it is marked read before its item is redrawn
+        if self.target_group_id is not None:
+            self.db_manager.mark_group_read(self.target_group_id, self.current_user_id)
+        elif self.target_user_id is not None:
+            self.db_manager.mark_conversation_read(self.current_user_id, self.target_user_id)
+        self.refresh_conversations()
+        if not self.search_mode_button.isChecked():
+            self.filter_conversations(self.search_input.text())
+        if self.has_target():
+            self.append_new_messages()
+    
+    def set_search_mode(self, enabled):
+        self.conversation_list.setVisible(not enabled)
+        self.search_results.setVisible(enabled)
+        self.search_input.setPlaceholderText("Search message text..." if enabled else "Search by phone/name...")
+        self.search_results.clear()
+        self.filter_conversations(self.search_input.text())
+    
+    def run_message_search(self):
+        self.search_results.clear()
+        results = self.db_manager.search_messages(self.current_user_id, self.search_input.text(),
+                                                  limit=self.SEARCH_PAGE_SIZE)
+        for _, partner_id, partner_name, timestamp, snippet, _ in results:
+            item = QListWidgetItem(f"{partner_name} - {timestamp}\n{snippet}")
+            item.setData(Qt.ItemDataRole.UserRole, partner_id)
+            self.search_results.addItem(item)
+    
+    def open_search_result(self, item):
+        self.target_user_id = item.data(Qt.ItemDataRole.UserRole)
+        self.target_group_id = None
+        self.update_messages()
     
     def filter_conversations(self, text):
+        if self.search_mode_button.isChecked():
+            self.search_timer.start()
+            return
         for i in range(self.conversation_list.count()):
             item = self.conversation_list.item(i)
             item.setHidden(text.lower() not in item.text().lower())
     
     def select_conversation(self, item):
         self.target_user_id = item.data(Qt.ItemDataRole.UserRole)
+        self.target_group_id = item.data(self.GROUP_ROLE)
+        if self.target_group_id is not None:
+            self.db_manager.mark_group_read(self.target_group_id, self.current_user_id)
+        else:
+            self.db_manager.mark_conversation_read(self.current_user_id, self.target_user_id)
+        item.setText(item.data(Qt.ItemDataRole.UserRole + 1))
         self.update_messages()
     
     def send_message(self):
@@ -76,7 +211,7 @@ class MessagingTab(QWidget):
         if not msg:
             return
         # If no conversation is selected, try to create a new one based on search input.
-        if self.target_user_id is None:
+        if not self.has_target():
             search_text = self.search_input.text().strip()
             if not search_text:
                 QMessageBox.warning(self, "Error", "Please select or specify a conversation.")
@@ -86,36 +221,140 @@ class MessagingTab(QWidget):
                 QMessageBox.warning(self, "Error", "User not found.")
                 return
             self.target_user_id = partner[0]
-        self.db_manager.add_message(self.current_user_id, self.target_user_id, msg)
-        self.update_messages()
+            self.newest_id = None
+        self.post(msg)
+        self.append_new_messages()
         self.message_input.clear()
     
     def attach_file(self):
-        if self.target_user_id is None:
+        if not self.has_target():
             QMessageBox.warning(self, "Error", "Please select a conversation.")
             return
         file_path, _ = QFileDialog.getOpenFileName(self, "Select File")
-        if file_path:
-            msg = f"[Attachment: {os.path.basename(file_path)}]"
-            self.db_manager.add_message(self.current_user_id, self.target_user_id, msg)
-            self.update_messages()
+        if not file_path:
+            return
+        try:
+            self.db_manager.add_attachment_message(self.current_user_id, file_path,
+                                                   recipient_id=self.target_user_id,
+                                                   group_id=self.target_group_id)
+        except OSError as e:
+            QMessageBox.warning(self, "Error", f"Could not attach file: {e}")
+            return
+        if self.target_group_id is not None:
+            self.db_manager.mark_group_read(self.target_group_id, self.current_user_id)
+        self.append_new_messages()
+    
+    def save_attachment(self, url):
+        if url.scheme() != "attachment":
+            return
+        attachment = self.db_manager.get_attachment(int(url.path()))
+        if attachment is None:
+            return
+        sha256, name, _ = attachment
+        dest_path, _ = QFileDialog.getSaveFileName(self, "Save Attachment", name)
+        if not dest_path:
+            return
+        try:
+            self.db_manager.attachment_store.export(sha256, dest_path)
+        except OSError as e:
+            QMessageBox.warning(self, "Error", f"Could not save attachment: {e}")
+    
+    def insert_messages(self, cursor, messages):
+        # Writes messages as separate blocks at cursor; attachment messages get a link
+        attachments = self.db_manager.get_attachments(message[0] for message in messages)
+        for i, (message_id, timestamp, content, sender_name) in enumerate(messages):
+            if i:
+                cursor.insertBlock()
+            attachment = attachments.get(message_id)
+            if attachment is None:
+                cursor.insertText(f"{timestamp} - {sender_name}: {content}", QTextCharFormat())
+                continue
+            attachment_id, name, size = attachment
+            cursor.insertText(f"{timestamp} - {sender_name}: ", QTextCharFormat())
+            link = QTextCharFormat()
+            link.setAnchor(True)
+            link.setAnchorHref(f"attachment:{attachment_id}")
+            link.setFontUnderline(True)
+            link.setForeground(self.palette().color(QPalette.ColorRole.Link))
+            cursor.insertText(name, link)
+            cursor.insertText(f" ({max(1, round(size / 1024))} KB)", QTextCharFormat())
+    
+    def append_messages(self, messages):
+        if not messages:
+            return
+        scroll_bar = self.chat_display.verticalScrollBar()
+        at_bottom = scroll_bar.value() == scroll_bar.maximum()
+        cursor = QTextCursor(self.chat_display.document())
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        if not self.chat_display.document().isEmpty():
+            cursor.insertBlock()
+        self.insert_messages(cursor, messages)
+        if at_bottom:
+            scroll_bar.setValue(scroll_bar.maximum())
     
     def update_messages(self):
-        messages = self.db_manager.get_messages_between(self.current_user_id, self.target_user_id)
+        # Open on the newest page only; older history is fetched lazily
+        messages = self.fetch_page()
+        self.loading_older = True
         self.chat_display.clear()
-        for timestamp, content, sender_name in messages:
-            self.chat_display.append(f"{timestamp} - {sender_name}: {content}")
+        self.append_messages(messages)
+        self.set_oldest_cursor(messages)
+        self.newest_id = messages[-1][0] if messages else None
+        scroll_bar = self.chat_display.verticalScrollBar()
+        scroll_bar.setValue(scroll_bar.maximum())
+        self.loading_older = False
+    
+    def append_new_messages(self):
+        # Append only what arrived after the newest message already shown
+        if self.newest_id is None:
+            self.update_messages()
+            return
+        messages = self.fetch_since(self.newest_id)
+        self.append_messages(messages)
+        if messages:
+            self.newest_id = messages[-1][0]
+    
+    def set_oldest_cursor(self, messages):
+        if messages:
+            message_id, timestamp, _, _ = messages[0]
+            self.oldest_cursor = (timestamp, message_id)
+        self.has_older = len(messages) == self.PAGE_SIZE
+    
+    def on_chat_scrolled(self, value):
+        if value == self.chat_display.verticalScrollBar().minimum() and self.has_older and not self.loading_older:
+            self.load_older_messages()
+    
+    def load_older_messages(self):
+        messages = self.fetch_page(before=self.oldest_cursor)
+        self.set_oldest_cursor(messages)
+        if not messages:
+            return
+        self.loading_older = True
+        scroll_bar = self.chat_display.verticalScrollBar()
+        old_maximum = scroll_bar.maximum()
+        # Prepend the page and keep the viewport on the line the user was reading
+        cursor = QTextCursor(self.chat_display.document())
+        cursor.movePosition(QTextCursor.MoveOperation.Start)
+        self.insert_messages(cursor, messages)
+        cursor.insertBlock()
+        scroll_bar.setValue(scroll_bar.value() + scroll_bar.maximum() - old_maximum)
+        self.loading_older = False
 
 class StatusTab(QWidget):
     def __init__(self, db_manager, current_user_id, parent=None):
         super().__init__(parent)
         self.db_manager = db_manager
         self.current_user_id = current_user_id
+        self.newest_status_id = 0
+        # (timestamp, id) of the oldest status shown; older pages load on scroll to bottom
+        self.oldest_cursor = None
+        self.has_older = False
         self.initUI()
     
     def initUI(self):
         layout = QVBoxLayout(self)
         self.status_display = QListWidget()
+        self.status_display.verticalScrollBar().valueChanged.connect(self.on_feed_scrolled)
         layout.addWidget(self.status_display)
         self.status_input = QLineEdit()
         layout.addWidget(self.status_input)
@@ -123,9 +362,10 @@ class StatusTab(QWidget):
         self.post_button.clicked.connect(self.post_status)
         layout.addWidget(self.post_button)
         
+        # The user's role and landlord are looked up once
+        self.user = self.db_manager.get_user(self.current_user_id)
         # Disable posting for tenants
-        user = self.db_manager.get_user(self.current_user_id)
-        if user and user[4] == "tenant":
+        if self.user and self.user[4] == "tenant":
             self.status_input.setDisabled(True)
             self.post_button.setDisabled(True)
             self.status_input.setPlaceholderText("View your landlord's statuses")
@@ -135,26 +375,53 @@ class StatusTab(QWidget):
     def post_status(self):
         status = self.status_input.text().strip()
         if status:
-            user = self.db_manager.get_user(self.current_user_id)
-            if user and user[4] == "landlord":
+            if self.user and self.user[4] == "landlord":
                 self.db_manager.add_status(self.current_user_id, status)
                 self.status_input.clear()
-                self.load_statuses()
+                self.on_statuses_changed()
             else:
                 QMessageBox.warning(self, "Not Allowed", "Only landlords can post status.")
     
+    def feed_owner_id(self):
+        if not self.user:
+            return None
+        # Tenants see their landlord's statuses
+        return self.user[5] if self.user[4] == "tenant" else self.current_user_id
+    
     def load_statuses(self):
         self.status_display.clear()
-        user = self.db_manager.get_user(self.current_user_id)
-        if not user:
+        owner_id = self.feed_owner_id()
+        if owner_id is None:
             return
-        if user[4] == "tenant":
-            landlord_id = user[5]
-            statuses = self.db_manager.get_statuses_for_group(landlord_id)
-        else:
-            statuses = self.db_manager.get_statuses_for_group(self.current_user_id)
-        for timestamp, status, sender_name in statuses:
+        statuses = self.db_manager.get_status_feed(owner_id)
+        self.newest_status_id = statuses[0][0] if statuses else 0
+        self.append_statuses(statuses)
+    
+    def append_statuses(self, statuses):
+        for _, timestamp, status, sender_name in statuses:
             self.status_display.addItem(f"{timestamp} - {sender_name}: {status}")
+        if statuses:
+            status_id, timestamp, _, _ = statuses[-1]
+            self.oldest_cursor = (timestamp, status_id)
+        self.has_older = len(statuses) == self.db_manager.STATUS_PAGE_SIZE
+    
+    def on_feed_scrolled(self, value):
+        if value == self.status_display.verticalScrollBar().maximum() and self.has_older:
+            self.has_older = False
+            statuses = self.db_manager.get_status_feed(self.feed_owner_id(), before=self.oldest_cursor)
+            self.append_statuses(statuses)
+    
+    def on_statuses_changed(self):
+        # Only statuses newer than the newest one shown are fetched and prepended
+        owner_id = self.feed_owner_id()
+        if owner_id is None:
+            return
+        # Another connection may have posted, so the shared first page is stale too
+        self.db_manager.invalidate_status_feed(owner_id)
+        statuses = self.db_manager.get_statuses_since(owner_id, self.newest_status_id)
+        for status_id, timestamp, status, sender_name in reversed(statuses):
+            self.status_display.insertItem(0, f"{timestamp} - {sender_name}: {status}")
+            self.newest_status_id = max(self.newest_status_id, status_id)
 
 # Similar implementations for GroupsTab, ProfileTab, ApartmentManagementTab, DashboardTab...
 # For brevity, refer to the previous full code for these classes.
@@ -164,42 +431,3 @@ from view.groups_tab import GroupsTab
 from view.profile_tab import ProfileTab
 from view.apartment_tab import ApartmentManagementTab
 from view.dashboard_tab import DashboardTab
-
-# In your actual project, these files would contain the corresponding tab classes.
-
-# =========================
-# view/dashboard_tab.py (example)
-# =========================
-class DashboardTab(QWidget):
-    def __init__(self, db_manager, parent=None):
-        super().__init__(parent)
-        self.db_manager = db_manager
-        self.initUI()
-    
-    def initUI(self):
-        layout = QVBoxLayout(self)
-        # Matplotlib plot
-        from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-        self.figure, self.ax = plt.subplots(figsize=(4,3))
-        self.canvas = FigureCanvas(self.figure)
-        layout.addWidget(self.canvas)
-        self.update_dashboard()
-    
-    def update_dashboard(self):
-        rooms = self.db_manager.get_rooms()
-        total = len(rooms)
-        occupied = sum(1 for _, tenant in rooms if tenant)
-        occupancy_pct = (occupied / total * 100) if total > 0 else 0
-        days = np.arange(1, 21)
-        history = np.linspace(70, occupancy_pct, num=20) + np.random.randint(-3, 4, size=20)
-        slope, intercept, r_value, _, _ = stats.linregress(days, history)
-        trend = slope * days + intercept
-        
-        self.ax.clear()
-        self.ax.plot(days, history, 'o-', label="Occupancy (%)")
-        self.ax.plot(days, trend, 'r--', label=f"Trend (r={r_value:.2f})")
-        self.ax.set_title("Apartment Occupancy (Current: {:.1f}%)".format(occupancy_pct))
-        self.ax.set_xlabel("Day")
-        self.ax.set_ylabel("Occupancy (%)")
-        self.ax.legend()
-        self.canvas.draw()